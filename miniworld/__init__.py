@@ -1,3 +1,32 @@
-from miniworld import envs, miniworld
+import importlib
+
+# Registers the environments, without importing them
+from miniworld import envs
 
 __version__ = "2.0.0"
+
+# Submodules imported on first access, as attributes of the package
+SUBMODULES = [
+    "cache",
+    "entity",
+    "layouts",
+    "math",
+    "memory",
+    "miniworld",
+    "navigation",
+    "objmesh",
+    "opengl",
+    "params",
+    "recording",
+    "trajectories",
+    "utils",
+    "vector",
+    "wrappers",
+]
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,255 @@
+import functools
+import json
+import os
+import struct
+
+import numpy as np
+
+from miniworld.utils import get_subdir_path
+
+# Name of the asset archive, in the package directory
+# Another archive can be used by setting MINIWORLD_ASSET_ARCHIVE
+ARCHIVE_FILE = "assets.pack"
+
+MAGIC = b"MWPAK"
+VERSION = 1
+
+# Header: magic, version, length of the JSON index, start of the arrays
+HEADER = struct.Struct("<5sIQQ")
+
+# Names of the vertex arrays of a mesh chunk
+CHUNK_ARRAYS = ["verts", "texcs", "norms", "color"]
+
+# Alignment of the arrays in the archive, in bytes
+ALIGNMENT = 64
+
+# Directory the names of the assets are relative to
+PACKAGE_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+def asset_name(path):
+    """
+    Name of an asset file in the archive: its path relative to the
+    package directory, or None if it is outside of the package
+    """
+
+    name = os.path.relpath(os.path.realpath(path), PACKAGE_DIR)
+    if name.startswith(".."):
+        return None
+    return name.replace(os.sep, "/")
+
+
+class AssetArchive:
+    """
+    Textures and meshes of the package, pre-decoded into raw pixel and
+    vertex arrays, stored in a single indexed file.
+
+    The file is memory-mapped, so only the assets actually used are read,
+    and the page cache shares them between all the processes of a node.
+    Textures are stored as RGBA pixels, bottom row first, the way they are
+    uploaded to OpenGL. Meshes are stored as the vertex arrays of their
+    chunks, as produced by ObjMesh.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic, version, index_len, self.data_start = HEADER.unpack_from(self.data)
+        assert magic == MAGIC, f"{path} is not an asset archive"
+        assert version == VERSION, f"unsupported asset archive version {version}"
+
+        start = HEADER.size
+        self.index = json.loads(bytes(self.data[start : start + index_len]))
+
+    def _array(self, entry):
+        dtype = np.dtype(entry["dtype"])
+        start = self.data_start + entry["offset"]
+        stop = start + dtype.itemsize * int(np.prod(entry["shape"]))
+        return self.data[start:stop].view(dtype).reshape(entry["shape"])
+
+    def _lookup(self, kind, path):
+        """
+        Get the index entry of an asset file, unless the file changed
+        since the archive was built
+        """
+
+        name = asset_name(path)
+        entry = self.index[kind].get(name) if name is not None else None
+        if entry is None:
+            return None
+
+        if os.path.exists(path) and os.path.getsize(path) != entry["size"]:
+            return None
+
+        return entry
+
+    def texture(self, path):
+        """
+        Get the (height, width, 4) pixels of a texture file, or None
+        if it isn't in the archive
+        """
+
+        entry = self._lookup("textures", path)
+        if entry is None:
+            return None
+        return self._array(entry)
+
+    def mesh(self, path):
+        """
+        Get the extents and the chunk data of a mesh file, as stored by
+        ObjMesh, or None if it isn't in the archive
+        """
+
+        entry = self._lookup("meshes", path)
+        if entry is None:
+            return None
+
+        chunk_data = []
+        for chunk in entry["chunks"]:
+            arrays = [self._array(chunk[name]) for name in CHUNK_ARRAYS]
+            tex_name = chunk["texture"]
+            tex_path = os.path.join(PACKAGE_DIR, tex_name) if tex_name else None
+            chunk_data.append((*arrays, tex_path))
+
+        min_coords = np.array(entry["min_coords"], dtype=np.float32)
+        max_coords = np.array(entry["max_coords"], dtype=np.float32)
+        return min_coords, max_coords, chunk_data
+
+
+@functools.lru_cache(maxsize=None)
+def get_archive():
+    """
+    Get the asset archive, memory-mapped on first use,
+    or None if it was not built
+    """
+
+    path = os.environ.get("MINIWORLD_ASSET_ARCHIVE", get_subdir_path(ARCHIVE_FILE))
+    if not os.path.exists(path):
+        return None
+    return AssetArchive(path)
+
+
+def texture_pixels(path):
+    """
+    Get the pixels of a texture file from the asset archive,
+    or None if there is no archive or the texture isn't in it
+    """
+
+    archive = get_archive()
+    return archive.texture(path) if archive is not None else None
+
+
+def mesh_data(path):
+    """
+    Get the extents and chunk data of a mesh file from the asset archive,
+    or None if there is no archive or the mesh isn't in it
+    """
+
+    archive = get_archive()
+    return archive.mesh(path) if archive is not None else None
+
+
+def asset_files():
+    """
+    List the texture and mesh files of the package
+    """
+
+    textures = []
+    for sub_dir in ["textures", "textures/chars", "textures/portraits", "meshes"]:
+        dir_path = get_subdir_path(sub_dir)
+        if os.path.isdir(dir_path):
+            textures += [
+                os.path.join(dir_path, name)
+                for name in sorted(os.listdir(dir_path))
+                if name.endswith(".png")
+            ]
+
+    meshes_dir = get_subdir_path("meshes")
+    meshes = [
+        os.path.join(meshes_dir, name)
+        for name in sorted(os.listdir(meshes_dir))
+        if name.endswith(".obj")
+    ]
+
+    return textures, meshes
+
+
+def build_archive(path, textures=None, meshes=None, verbose=False):
+    """
+    Decode texture and mesh files, all those of the package by default,
+    and pack them into an asset archive
+    """
+
+    # Decoding uses the same code as loading the files directly
+    import pyglet
+
+    from miniworld.objmesh import ObjMesh
+
+    if textures is None or meshes is None:
+        all_textures, all_meshes = asset_files()
+        textures = all_textures if textures is None else textures
+        meshes = all_meshes if meshes is None else meshes
+
+    index = {"textures": {}, "meshes": {}}
+    arrays = []
+    offset = 0
+
+    def add_array(array):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        entry = {
+            "offset": offset,
+            "shape": list(array.shape),
+            "dtype": array.dtype.str,
+        }
+        arrays.append((offset, array))
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        return entry
+
+    for tex_path in textures:
+        if verbose:
+            print(tex_path)
+        img = pyglet.image.load(tex_path)
+        pixels = np.frombuffer(
+            img.get_image_data().get_data("RGBA", img.width * 4), dtype=np.uint8
+        ).reshape(img.height, img.width, 4)
+        entry = add_array(pixels)
+        entry["size"] = os.path.getsize(tex_path)
+        index["textures"][asset_name(tex_path)] = entry
+
+    for mesh_path in meshes:
+        if verbose:
+            print(mesh_path)
+        mesh = ObjMesh(mesh_path, use_archive=False)
+        chunks = []
+        for verts, texcs, norms, color, tex_path in mesh.chunk_data:
+            chunk = {
+                name: add_array(array)
+                for name, array in zip(CHUNK_ARRAYS, [verts, texcs, norms, color])
+            }
+            chunk["texture"] = asset_name(tex_path) if tex_path else None
+            chunks.append(chunk)
+        index["meshes"][asset_name(mesh_path)] = {
+            "size": os.path.getsize(mesh_path),
+            "min_coords": mesh.min_coords.tolist(),
+            "max_coords": mesh.max_coords.tolist(),
+            "chunks": chunks,
+        }
+
+    # The arrays start after the header and the index, aligned
+    index_bytes = json.dumps(index).encode()
+    data_start = HEADER.size + len(index_bytes)
+    data_start = -(-data_start // ALIGNMENT) * ALIGNMENT
+
+    # Write to a temporary file, so that readers never see a partial archive
+    with open(path + ".tmp", "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(index_bytes), data_start))
+        file.write(index_bytes)
+        for array_offset, array in arrays:
+            file.seek(data_start + array_offset)
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(path + ".tmp", path)
+
+    get_archive.cache_clear()
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ObsCache:
+    """
+    Least-recently-used cache of rendered observations.
+
+    Observations are keyed by the version of the static world, the
+    quantized camera pose and field of view, the lighting and the state
+    of the non-static entities. When the agent comes back to a pose it
+    has already observed, the observation is copied from the cache
+    instead of being rendered again:
+
+        env.unwrapped.obs_cache = ObsCache(max_bytes=256 * 2**20)
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, quantum=1e-3):
+        """
+        max_bytes -- memory budget of the cached observations
+        quantum   -- resolution at which poses, angles and colors are compared
+        """
+
+        self.max_bytes = max_bytes
+        self.quantum = quantum
+
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, world):
+        """
+        Compute the key of the observation of the current state of a world
+        """
+
+        agent = world.agent
+        values = [
+            agent.cam_pos,
+            agent.cam_dir,
+            [agent.cam_fov_y],
+            world.sky_color,
+            world.light_pos,
+            world.light_color,
+            world.light_ambient,
+        ]
+
+        # Non-static entities are rendered on top of the static world
+        for ent in world.entities:
+            if not ent.is_static and ent is not agent:
+                values.append(ent.pos)
+                values.append([ent.dir])
+                if hasattr(ent, "color_vec"):
+                    values.append(ent.color_vec)
+
+        values = np.concatenate(values) / self.quantum
+        return world.static_version, np.round(values).astype(np.int64).tobytes()
+
+    def get(self, key):
+        """
+        Get a cached observation, or None if it isn't cached
+        """
+
+        obs = self.entries.get(key)
+        if obs is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return obs
+
+    def put(self, key, obs):
+        """
+        Add an observation to the cache, evicting the least recently
+        used ones to stay within the memory budget
+        """
+
+        if obs.nbytes > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key).nbytes
+
+        self.entries[key] = obs
+        self.nbytes += obs.nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
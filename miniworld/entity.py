@@ -2,6 +2,10 @@ import math
 
 import numpy as np
 
+# pyglet options are set by miniworld.opengl, before pyglet.gl is imported
+# isort: off
+import miniworld.opengl  # noqa: F401
+
 # Map of color names to RGB values
 from pyglet.gl import (
     GL_LINES,
@@ -23,6 +27,8 @@ from pyglet.gl import (
     glVertex3f,
 )
 
+# isort: on
+
 from miniworld.math import X_VEC, Y_VEC, Z_VEC, gen_rot_matrix
 from miniworld.objmesh import ObjMesh
 from miniworld.opengl import Texture, drawBox
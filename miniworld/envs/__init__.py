@@ -1,53 +1,51 @@
-import inspect
+import importlib
 
 import gymnasium as gym
 
-from miniworld.envs.collecthealth import CollectHealth
-from miniworld.envs.fourrooms import FourRooms
-from miniworld.envs.hallway import Hallway
-from miniworld.envs.maze import Maze, MazeS2, MazeS3, MazeS3Fast
-from miniworld.envs.oneroom import OneRoom, OneRoomS6, OneRoomS6Fast
-from miniworld.envs.pickupobjects import PickupObjects
-from miniworld.envs.putnext import PutNext
-from miniworld.envs.roomobjects import RoomObjects
-from miniworld.envs.sidewalk import Sidewalk
-from miniworld.envs.sign import Sign
-from miniworld.envs.threerooms import ThreeRooms
-from miniworld.envs.tmaze import TMaze, TMazeLeft, TMazeRight
-from miniworld.envs.wallgap import WallGap
-from miniworld.envs.ymaze import YMaze, YMazeLeft, YMazeRight
-
-# new env for the serotonin task
-from miniworld.envs.taskHallway import TaskHallway
-from miniworld.envs.taskHallwayControl import TaskHallwayControl
-from miniworld.envs.taskHallwaySimple import TaskHallwaySimple
-from miniworld.envs.soleneHallway import SoleneHallway
+# Modules defining the environment classes, by class name
+# Environment modules, and through them pyglet and OpenGL, are only
+# imported when an environment is first created, or when a class is
+# accessed as an attribute of this package
+ENV_MODULES = {
+    "CollectHealth": "collecthealth",
+    "FourRooms": "fourrooms",
+    "Hallway": "hallway",
+    "Maze": "maze",
+    "MazeS2": "maze",
+    "MazeS3": "maze",
+    "MazeS3Fast": "maze",
+    "OneRoom": "oneroom",
+    "OneRoomS6": "oneroom",
+    "OneRoomS6Fast": "oneroom",
+    "PickupObjects": "pickupobjects",
+    "PutNext": "putnext",
+    "RoomObjects": "roomobjects",
+    "Sidewalk": "sidewalk",
+    "Sign": "sign",
+    "ThreeRooms": "threerooms",
+    "TMaze": "tmaze",
+    "TMazeLeft": "tmaze",
+    "TMazeRight": "tmaze",
+    "WallGap": "wallgap",
+    "YMaze": "ymaze",
+    "YMazeLeft": "ymaze",
+    "YMazeRight": "ymaze",
+    # new env for the serotonin task
+    "TaskHallway": "taskHallway",
+    "TaskHallwayControl": "taskHallwayControl",
+    "TaskHallwaySimple": "taskHallwaySimple",
+    "SoleneHallway": "soleneHallway",
+}
 
 # Registered environment ids
-from miniworld.miniworld import MiniWorldEnv
-
 env_ids = []
 
-def register_envs():
-    module_name = __name__
-    global_vars = globals()
-
-    # Iterate through global names
-    for global_name in sorted(list(global_vars.keys())):
-        env_class = global_vars[global_name]
-
-        if not inspect.isclass(env_class):
-            continue
-
-        if not issubclass(env_class, gym.core.Env):
-            continue
-
-        if env_class is MiniWorldEnv:
-            continue
 
-        # Register the environment with OpenAI Gym
-        gym_id = f"MiniWorld-{global_name}-v0"
-        entry_point = f"{module_name}:{global_name}"
+def register_envs():
+    for name in sorted(ENV_MODULES):
+        # Register the environment with Gymnasium
+        gym_id = f"MiniWorld-{name}-v0"
+        entry_point = f"{__name__}.{ENV_MODULES[name]}:{name}"
 
         gym.envs.registration.register(
             id=gym_id,
@@ -56,7 +54,18 @@ def register_envs():
 
         env_ids.append(gym_id)
 
-        # print('Registered env:', gym_id)
+
+def __getattr__(name):
+    if name in ENV_MODULES:
+        module = importlib.import_module(f"{__name__}.{ENV_MODULES[name]}")
+        return getattr(module, name)
+
+    if name == "MiniWorldEnv":
+        from miniworld.miniworld import MiniWorldEnv
+
+        return MiniWorldEnv
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 register_envs()
@@ -95,7 +95,7 @@ class Sidewalk(MiniWorldEnv, utils.EzPickle):
         obs, reward, termination, truncation, info = super().step(action)
 
         # Walking into the street ends the episode
-        if self.street.point_inside(self.agent.pos):
+        if self.room_at(self.agent.pos) is self.street:
             reward = 0
             termination = True
 
@@ -1,7 +1,6 @@
 import math
 
 from gymnasium import spaces, utils
-import numpy as np
 from miniworld.entity import Box, ImageFrame,TextFrame
 from miniworld.miniworld import MiniWorldEnv
 
@@ -39,6 +38,10 @@ class SoleneHallway(MiniWorldEnv, utils.EzPickle):
     `length`: length of the entire space
     """
 
+    # Redrawing the same flag would not be detected, True and False
+    # being shared objects
+    layout_attrs = ["is_rewarded", "is_ambiguous"]
+
     def __init__(self, length=400,is_random=False, is_rewarded=True,is_ambiguous=False,is_reward_training=False, **kwargs):
         assert length >= 2
         self.length = length
@@ -49,12 +52,9 @@ class SoleneHallway(MiniWorldEnv, utils.EzPickle):
         self.is_reward_training = is_reward_training
         print(kwargs)
 
-        if is_random:
-            self.is_rewarded = np.random.choice([True,False],p=[0.5,0.5])
-            self.is_ambiguous = np.random.choice([True,False],p=[0.2,0.8])
-        else :
-            self.is_rewarded = is_rewarded
-            self.is_ambiguous = is_ambiguous
+        # If random, these are drawn on each reset, from the seeded generator
+        self.is_rewarded = is_rewarded
+        self.is_ambiguous = is_ambiguous
 
         print("is_rewarded",is_rewarded,"is_ambiguous",is_ambiguous)
 
@@ -67,7 +67,9 @@ class SoleneHallway(MiniWorldEnv, utils.EzPickle):
         self.action_space = spaces.Discrete(self.actions.move_forward + 1)
 
     def _gen_world(self):
-
+        if self.is_random:
+            self.is_rewarded = bool(self.np_random.choice([True,False],p=[0.5,0.5]))
+            self.is_ambiguous = bool(self.np_random.choice([True,False],p=[0.2,0.8]))
 
         simple_patterns = False
         if simple_patterns :
@@ -1,9 +1,8 @@
 import math
 
 from gymnasium import spaces, utils
-import numpy as np
 from miniworld.entity import Box
-from miniworld.miniworld import MiniWorldEnv
+from miniworld.miniworld import GainSchedule, MiniWorldEnv
 
 class TaskHallway(MiniWorldEnv, utils.EzPickle):
 
@@ -45,9 +44,18 @@ class TaskHallway(MiniWorldEnv, utils.EzPickle):
 
     max_section_length      : maximum length of a section. 
                               The length of a section is chosen randomly between min_section_length and max_section_length.
+
+    The sections are drawn again on each reset, from the seeded random
+    number generator. The motor gain of the section the agent is in is
+    applied at each step, and reported in the step info along with the
+    section index.
     
     """
 
+    # Section lists are new objects on each reset, but the total length
+    # may be drawn equal to the previous one
+    layout_attrs = ["total_length"]
+
     def __init__(self,  nb_sections=5,
                         proba_change_motor_gain=0.5,
                         motor_gains=[0.3,0.6,2,3],
@@ -67,33 +75,39 @@ class TaskHallway(MiniWorldEnv, utils.EzPickle):
         self.min_section_length = min_section_length
         self.max_section_length = max_section_length
 
+        # The sections are drawn on each reset, from the seeded generator
+        self.sections_limit = None
+        self.sections_length = None
+        self.sections_motor_gain = None
+        self.total_length = None
+
+        MiniWorldEnv.__init__(self, max_episode_steps=self.max_episode_steps, **kwargs)
+        utils.EzPickle.__init__(self, **kwargs)
+
+        # Allow only movement actions (left/right/forward) => do we want to allow left / right actions?
+        self.action_space = spaces.Discrete(self.actions.move_forward + 1)
+
+    def _gen_sections(self):
         self.sections_limit = [-1]
         self.sections_length = []
         self.sections_motor_gain = []
 
         for s in range(self.nb_sections):
-            length = np.random.randint(self.min_section_length,self.max_section_length)
+            length = int(self.np_random.integers(self.min_section_length,self.max_section_length))
             self.sections_limit.append(self.sections_limit[-1] + length)
             self.sections_length.append(length)
-            if (np.random.random() < self.proba_change_motor_gain): # remove  (s > 0) and  , actually motor_gain = 1 should not be such a special case 
+            if (self.np_random.random() < self.proba_change_motor_gain): # remove  (s > 0) and  , actually motor_gain = 1 should not be such a special case 
                 motor_gain = self.np_random.choice(self.motor_gains)
             else:
                 motor_gain = 1
             self.sections_motor_gain.append(motor_gain)
 
         self.total_length = self.sections_limit[-1]
-
-        print("sections limits", self.sections_limit)
-        print("sections lengths", self.sections_length)
-        print("sections motor gains", self.sections_motor_gain)
-
-        MiniWorldEnv.__init__(self, max_episode_steps=self.max_episode_steps, **kwargs)
-        utils.EzPickle.__init__(self, **kwargs)
-
-        # Allow only movement actions (left/right/forward) => do we want to allow left / right actions?
-        self.action_space = spaces.Discrete(self.actions.move_forward + 1)
+        self.gain_schedule = GainSchedule(self.sections_limit, self.sections_motor_gain)
 
     def _gen_world(self):
+        self._gen_sections()
+
         # Create a long rectangular room
         room = self.add_rect_room(min_x=-1, max_x=-1 + self.total_length,
                                   min_z=-1, max_z=1,
@@ -1,9 +1,8 @@
 import math
 
 from gymnasium import spaces, utils
-import numpy as np
 from miniworld.entity import Box
-from miniworld.miniworld import MiniWorldEnv
+from miniworld.miniworld import GainSchedule, MiniWorldEnv
 
 class TaskHallwayControl(MiniWorldEnv, utils.EzPickle):
 
@@ -32,32 +31,56 @@ class TaskHallwayControl(MiniWorldEnv, utils.EzPickle):
 
     ## Arguments
 
-    TaskHallwayControl(nb_sections=3,motor_gains=[1,1,1],sections_length=[5,5,10])
+    TaskHallwayControl(nb_sections=3,motor_gains=[1,1,1],sections_length=[5,5,10],sections_glitch=None)
 
     nb_sections             : number of sections in the hallway. For each section, there is a probability that the motor gain will be different from 1.
 
+    random_gain             : if True, the motor gain of each section is drawn from motor_gains on each reset
+
     motor_gains             : list of the motor gains for each section
 
     sections_length : lengths of the hallway sections
 
+    sections_glitch : offsets along the hallway applied to the agent when entering each section
+
+    The motor gain of the section the agent is in is applied at each step,
+    and reported in the step info along with the section index.
+
     """
 
-    def __init__(self,  nb_sections=3,
-                        random_gain = False,
-                        motor_gains=[1,0.5,2],
-                        sections_length=[5,5,10],
-                        max_episode_steps=100,
-                        **kwargs):
+    def __init__(
+        self,
+        nb_sections=3,
+        random_gain=False,
+        motor_gains=[1, 0.5, 2],
+        sections_length=[5, 5, 10],
+        sections_glitch=None,
+        max_episode_steps=100,
+        **kwargs
+    ):
         
         # if training, we want the agent to spawn randomly in the hallway, and not in the opposite side to the reward
         self.max_episode_steps = max_episode_steps
         
         self.nb_sections = nb_sections
 
-        if random_gain :
-            self.motor_gains = np.random.choice(motor_gains,nb_sections)
-        else :
-            self.motor_gains = motor_gains
+        # With random_gain, the gains of the sections are drawn from
+        # motor_gains on each reset, from the seeded generator
+        self.random_gain = random_gain
+        self.motor_gains = motor_gains
+
+        if not random_gain and len(self.motor_gains) < nb_sections:
+            raise ValueError(
+                f"{len(self.motor_gains)} motor gains given for {nb_sections} sections"
+            )
+        if len(sections_length) < nb_sections:
+            raise ValueError(
+                f"{len(sections_length)} section lengths given for {nb_sections} sections"
+            )
+        if sections_glitch is not None and len(sections_glitch) != nb_sections:
+            raise ValueError(
+                f"{len(sections_glitch)} glitch offsets given for {nb_sections} sections"
+            )
 
         self.sections_limit = [-1]
         self.sections_length = []
@@ -67,7 +90,9 @@ class TaskHallwayControl(MiniWorldEnv, utils.EzPickle):
             self.sections_limit.append(self.sections_limit[-1] + length)
             self.sections_length.append(length)
 
-        self.sections_motor_gain = motor_gains
+        # Gains beyond the number of sections are ignored
+        self.sections_motor_gain = list(self.motor_gains[:nb_sections])
+        self.sections_glitch = sections_glitch
         self.total_length = self.sections_limit[-1]
 
         MiniWorldEnv.__init__(self, max_episode_steps=self.max_episode_steps, **kwargs)
@@ -77,6 +102,14 @@ class TaskHallwayControl(MiniWorldEnv, utils.EzPickle):
         self.action_space = spaces.Discrete(self.actions.move_forward + 1)
 
     def _gen_world(self):
+        if self.random_gain:
+            self.sections_motor_gain = list(
+                self.np_random.choice(self.motor_gains, self.nb_sections)
+            )
+        self.gain_schedule = GainSchedule(
+            self.sections_limit, self.sections_motor_gain, self.sections_glitch
+        )
+
         # Create a long rectangular room
         room = self.add_rect_room(min_x=-1, max_x=-1 + self.total_length,
                                   min_z=-1, max_z=1,
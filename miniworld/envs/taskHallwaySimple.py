@@ -1,7 +1,6 @@
 import math
 
 from gymnasium import spaces, utils
-import numpy as np
 from miniworld.entity import Box
 from miniworld.miniworld import MiniWorldEnv
 
@@ -47,6 +46,9 @@ class TaskHallwaySimple(MiniWorldEnv, utils.EzPickle):
     
     """
 
+    # Layouts would miss a length drawn equal to the previous one
+    layout_attrs = ["total_length"]
+
     def __init__(self,min_section_length=5,
                       max_section_length=10,
                       max_episode_steps=250,
@@ -62,8 +64,8 @@ class TaskHallwaySimple(MiniWorldEnv, utils.EzPickle):
         self.reset_keep_same_length = reset_keep_same_length
         self.wall_tex = wall_tex
 
-        self.total_length = np.random.randint(self.min_section_length,self.max_section_length)
-        print("hallway length : ", self.total_length)
+        # The length is drawn on the first reset, from the seeded generator
+        self.total_length = None
 
         MiniWorldEnv.__init__(self, max_episode_steps=self.max_episode_steps, **kwargs)
         utils.EzPickle.__init__(self, **kwargs)
@@ -74,12 +76,13 @@ class TaskHallwaySimple(MiniWorldEnv, utils.EzPickle):
     def _gen_world(self):
         # Create a long rectangular room
 
-        if not self.reset_keep_same_length :
-            self.total_length = np.random.randint(self.min_section_length,self.max_section_length)
+        if not self.reset_keep_same_length or self.total_length is None:
+            self.total_length = int(
+                self.np_random.integers(
+                    self.min_section_length, self.max_section_length
+                )
+            )
             # print("hallway length : ", self.total_length)
-        else :
-            # print('keep same length')
-            pass
 
         room = self.add_rect_room(min_x=-1, max_x=-1 + self.total_length,
                                   min_z=-1, max_z=1,
@@ -87,15 +90,32 @@ class TaskHallwaySimple(MiniWorldEnv, utils.EzPickle):
                                   floor_tex='asphalt',
                                   no_ceiling=True
                                   )
-        
+
+        self._place_entities(room)
+
+    def _gen_world_same_env(self):
+        # Only the box and the agent are placed again, in the same hallway
+        self._place_entities(self.rooms[0])
+
+    def _place_entities(self, room):
         # Place the box at the end of the hallway
         self.box = self.place_entity(Box(color="red"), min_x=room.max_x - 2)
 
         # if facing_forward, place the agent such that it is facing the reward
         if self.facing_forward :
-            self.place_agent(dir=self.np_random.uniform(-0.01, 0.01), max_x= 1)
+            self.place_agent(dir=self.np_random.uniform(-0.01, 0.01), max_x=1)
         else :
-            self.place_agent(dir=self.np_random.uniform(-math.pi / 4, math.pi / 4), max_x= 1)
+            self.place_agent(
+                dir=self.np_random.uniform(-math.pi / 4, math.pi / 4), max_x=1
+            )
+
+    def reset(self, *, seed=None, options=None):
+        # The hallway doesn't change when keeping the same length,
+        # so its geometry and render data are reused
+        if self.reset_keep_same_length:
+            options = dict(options or {}, keep_same_env=True)
+
+        return super().reset(seed=seed, options=options)
 
     def step(self, action):
         obs, reward, termination, truncation, info = super().step(action)
@@ -0,0 +1,81 @@
+import multiprocessing as mp
+import pickle
+
+import gymnasium as gym
+
+
+def _layout_worker(env_id, env_kwargs, seed, queue):
+    """
+    Worker process generating layouts until it is terminated
+    The queue being bounded, workers wait while the pool is full
+    """
+
+    # Layouts are generated without rendering
+    env = gym.make(env_id, obs_mode="state", **env_kwargs).unwrapped
+    env.reset(seed=seed)
+
+    # Layouts are pickled before generating the next one, since the queue
+    # pickles in a background thread and _gen_world may modify declared
+    # layout attributes in place
+    while True:
+        env._gen_layout()
+        queue.put(pickle.dumps(env._get_layout()))
+
+
+class LayoutPool:
+    """
+    Pool of world layouts pregenerated in background processes.
+
+    Layouts are serializable descriptions of the rooms, portals and
+    entity placements of a world. Environments using a pool instantiate
+    one of these on reset instead of generating the world themselves,
+    which takes world generation off the critical path:
+
+        pool = LayoutPool("MiniWorld-Maze-v0", size=16)
+        env = gym.make("MiniWorld-Maze-v0")
+        env.unwrapped.layout_pool = pool
+    """
+
+    def __init__(
+        self, env_id, size=8, num_workers=1, seed=None, context="spawn", **kwargs
+    ):
+        """
+        env_id      -- id (or spec) of the environment whose layouts are
+                       generated
+        size        -- number of layouts kept ready in the pool
+        num_workers -- number of worker processes
+        seed        -- seed of the first worker, the others using the
+                       following seeds
+        context     -- multiprocessing start method
+        kwargs      -- arguments passed to gym.make in each worker
+        """
+
+        ctx = mp.get_context(context)
+        self.queue = ctx.Queue(maxsize=size)
+
+        self.processes = []
+        for index in range(num_workers):
+            worker_seed = None if seed is None else seed + index
+            process = ctx.Process(
+                target=_layout_worker,
+                name="MiniWorldLayoutWorker-%d" % index,
+                args=(env_id, kwargs, worker_seed, self.queue),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def get(self, timeout=None):
+        """
+        Take a layout from the pool, waiting for one if the pool is empty
+        """
+
+        return pickle.loads(self.queue.get(timeout=timeout))
+
+    def close(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.processes = []
+        self.queue.close()
@@ -60,3 +60,35 @@ def intersect_circle_segs(point, radius, segs):
 
     # No intersection
     return None
+
+
+def intersect_circles_segs(points, radii, segs, owners):
+    """
+    Test, for each of several circles, if it intersects with any of the
+    wall segments it owns, where owners holds the index of the circle
+    each segment is tested against
+    """
+
+    # Ignore Y coordinate
+    points = points * np.array([1, 0, 1])
+    seg_points = points[owners]
+
+    a = segs[:, 0, :]
+    b = segs[:, 1, :]
+    ab = b - a
+    ap = seg_points - a
+
+    dotAPAB = np.sum(ap * ab, axis=1)
+    dotABAB = np.sum(ab * ab, axis=1)
+
+    proj_dist = dotAPAB / dotABAB
+    proj_dist = np.clip(proj_dist, 0, 1)
+    proj_dist = np.expand_dims(proj_dist, axis=1)
+
+    # Compute the closest point on each segment
+    c = a + proj_dist * ab
+
+    dist = np.linalg.norm(c - seg_points, axis=1)
+    hits = np.less(dist, radii[owners])
+
+    return np.bincount(owners[hits], minlength=len(points)) > 0
@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+
+from miniworld.objmesh import ObjMesh
+from miniworld.opengl import GLContext, Texture
+
+# Estimated GL bytes per vertex compiled into display lists or vertex lists:
+# position, normal, texture coordinates and color, as 32-bit floats
+GL_VERTEX_BYTES = (3 + 3 + 2 + 3) * 4
+
+# Mipmaps add a third to the size of a texture
+MIPMAP_FACTOR = 4 / 3
+
+
+def _usage(host=0, gl=0):
+    return {"host_bytes": int(host), "gl_bytes": int(gl)}
+
+
+def _add(total, usage):
+    total["host_bytes"] += usage["host_bytes"]
+    total["gl_bytes"] += usage["gl_bytes"]
+    return total
+
+
+def arrays_nbytes(obj):
+    """
+    Total size of the numpy arrays referenced by an object's attributes,
+    including those stored in lists and dicts one level deep
+    """
+
+    if obj is None:
+        return 0
+
+    total = 0
+    values = obj.values() if isinstance(obj, dict) else vars(obj).values()
+    for value in values:
+        if isinstance(value, dict):
+            value = list(value.values())
+        if isinstance(value, (list, tuple)):
+            total += sum(v.nbytes for v in value if isinstance(v, np.ndarray))
+        elif isinstance(value, np.ndarray):
+            total += value.nbytes
+    return total
+
+
+def process_rss():
+    """
+    Resident memory of the current process, in bytes, or None if unknown
+    """
+
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+
+        # Peak rather than current usage, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return None
+
+
+def frame_buffer_usage(frame_buffer):
+    """
+    Estimated memory of a frame buffer: the host image array, and the
+    multisampled (RGBA32F color, 16-bit depth) and resolved (RGBA8 color,
+    16-bit depth) GL buffers
+    """
+
+    if frame_buffer is None:
+        return _usage()
+
+    pixels = frame_buffer.width * frame_buffer.height
+    if frame_buffer.num_samples > 0:
+        multi = pixels * frame_buffer.num_samples * (16 + 2)
+    else:
+        multi = pixels * (4 + 2)
+    final = pixels * (4 + 2)
+
+    return _usage(frame_buffer.img_array.nbytes, multi + final)
+
+
+def texture_usage(width, height, uploaded, decoded):
+    host = width * height * 4 if decoded else 0
+    gl = width * height * 4 * MIPMAP_FACTOR if uploaded else 0
+    return _usage(host, gl)
+
+
+def frame_buffer_cache_report():
+    """
+    Memory of the frame buffers shared by all the envs of the process
+    """
+
+    frame_buffers = []
+    if GLContext.current is not None:
+        frame_buffers = [fb for fb, _ in GLContext.current.frame_buffers.values()]
+
+    total = _usage()
+    for frame_buffer in frame_buffers:
+        _add(total, frame_buffer_usage(frame_buffer))
+    total["count"] = len(frame_buffers)
+    return total
+
+
+def texture_cache_report():
+    """
+    Memory of the textures shared by all the envs of the process
+    """
+
+    total = _usage()
+    for tex in Texture.tex_cache.values():
+        _add(
+            total,
+            texture_usage(
+                tex.width, tex.height, tex.tex is not None, tex.img is not None
+            ),
+        )
+    total["count"] = len(Texture.tex_cache)
+    return total
+
+
+def mesh_cache_report():
+    """
+    Memory of the meshes shared by all the envs of the process,
+    including the textures loaded by the meshes themselves
+    """
+
+    total = _usage()
+    for mesh in ObjMesh.cache.values():
+        host = sum(sum(a.nbytes for a in chunk[:4]) for chunk in mesh.chunk_data)
+        gl = 0
+        if mesh.vlists is not None:
+            num_verts = sum(len(chunk[0]) // 3 for chunk in mesh.chunk_data)
+            gl = num_verts * GL_VERTEX_BYTES
+            for tex in mesh.textures:
+                if tex is not None:
+                    gl += tex.width * tex.height * 4 * MIPMAP_FACTOR
+        _add(total, _usage(host, gl))
+    total["count"] = len(ObjMesh.cache)
+    return total
+
+
+def env_report(env):
+    """
+    Memory used by a single env, by component
+    """
+
+    report = {}
+
+    # Room geometry, compiled into the static display list when rendering
+    num_verts = 0
+    host = 0
+    for room in env.rooms:
+        host += arrays_nbytes(room)
+        for name in ["floor_verts", "ceil_verts", "wall_verts"]:
+            verts = getattr(room, name, None)
+            if verts is not None:
+                num_verts += len(verts)
+    gl = num_verts * GL_VERTEX_BYTES if env.static_list is not None else 0
+    report["static_geometry"] = _usage(host, gl)
+
+    report["collision"] = _usage(
+        arrays_nbytes({"wall_segs": env.wall_segs}) + arrays_nbytes(env.room_index)
+    )
+    report["nav_grid"] = _usage(arrays_nbytes(env.nav_grid))
+
+    buffers = arrays_nbytes(
+        {
+            "obs_frame": env._obs_frame,
+            "obs_buffer": env.obs_buffer,
+            "param_tape": getattr(env, "param_tape", None),
+        }
+    )
+    if env.obs_cache is not None:
+        buffers += env.obs_cache.nbytes
+    report["obs_buffers"] = _usage(buffers)
+
+    return report
+
+
+def memory_report(env):
+    """
+    Memory used by an env and by the caches it shares with the other
+    envs of the process, with host and estimated GL bytes for each part
+    """
+
+    per_env = env_report(env)
+    shared = {
+        "frame_buffers": frame_buffer_cache_report(),
+        "textures": texture_cache_report(),
+        "meshes": mesh_cache_report(),
+    }
+
+    env_total = _usage()
+    for usage in per_env.values():
+        _add(env_total, usage)
+    shared_total = _usage()
+    for usage in shared.values():
+        _add(shared_total, usage)
+
+    return {
+        "env": per_env,
+        "shared": shared,
+        "env_total": env_total,
+        "shared_total": shared_total,
+        "process_rss": process_rss(),
+    }
@@ -1,3 +1,5 @@
+import copy
+import itertools
 import math
 from ctypes import POINTER
 from enum import IntEnum
@@ -10,6 +12,11 @@ import numpy as np
 import pyglet
 from gymnasium import spaces
 from gymnasium.core import ObsType
+
+# pyglet options are set by miniworld.opengl, before pyglet.gl is imported
+# isort: off
+import miniworld.opengl  # noqa: F401
+
 from pyglet.gl import (
     GL_AMBIENT,
     GL_AMBIENT_AND_DIFFUSE,
@@ -17,9 +24,7 @@ from pyglet.gl import (
     GL_COLOR_BUFFER_BIT,
     GL_COLOR_MATERIAL,
     GL_COMPILE,
-    GL_CULL_FACE,
     GL_DEPTH_BUFFER_BIT,
-    GL_DEPTH_TEST,
     GL_DIFFUSE,
     GL_FRAMEBUFFER,
     GL_FRONT_AND_BACK,
@@ -45,15 +50,12 @@ from pyglet.gl import (
     glClearDepth,
     glColor3f,
     glColorMaterial,
-    glDeleteLists,
-    glDeleteQueries,
     glDisable,
     glEnable,
     glEnd,
     glEndList,
     glEndQuery,
     glFlush,
-    glGenQueries,
     glGetQueryObjectuiv,
     glLightfv,
     glLoadIdentity,
@@ -69,9 +71,13 @@ from pyglet.gl import (
     glVertex3f,
 )
 
+# isort: on
+
 from miniworld.entity import Agent, Entity
 from miniworld.math import Y_VEC, intersect_circle_segs
-from miniworld.opengl import FrameBuffer, Texture, drawBox
+from miniworld.memory import memory_report
+from miniworld.navigation import NavGrid
+from miniworld.opengl import GLResources, Texture, drawBox
 from miniworld.params import DEFAULT_PARAMS
 
 # Default wall height for room
@@ -80,6 +86,15 @@ DEFAULT_WALL_HEIGHT = 3
 # Texture size/density in texels/meter
 TEX_DENSITY = 512
 
+# Motion parameters drawn for every step, from the randomness tape
+STEP_PARAMS = ["forward_drift", "forward_step", "turn_step"]
+
+# Maximum number of steps drawn at once into the randomness tape
+TAPE_LENGTH = 1024
+
+# Versions of the static world, unique across the envs of a process
+STATIC_VERSIONS = itertools.count()
+
 
 def gen_texcs_wall(tex, min_x, min_y, width, height):
     """
@@ -436,6 +451,230 @@ class Room:
         glEnd()
 
 
+class RoomIndex:
+    """
+    Uniform grid over the floorplan used to quickly find the room(s)
+    containing a point. Each grid cell stores the rooms whose bounding
+    box overlaps it, so a query only tests a handful of candidate rooms.
+    """
+
+    def __init__(self, rooms, cell_size=None):
+        assert len(rooms) > 0
+
+        self.rooms = rooms
+
+        # Compute the min and max x, z extents of the whole floorplan
+        self.min_x = min(r.min_x for r in rooms)
+        self.max_x = max(r.max_x for r in rooms)
+        self.min_z = min(r.min_z for r in rooms)
+        self.max_z = max(r.max_z for r in rooms)
+
+        # By default, aim for a few grid cells per room
+        if cell_size is None:
+            area = (self.max_x - self.min_x) * (self.max_z - self.min_z)
+            cell_size = math.sqrt(area / (4 * len(rooms)))
+        cell_size = max(cell_size, 1e-3)
+        self.cell_size = cell_size
+
+        self.num_cols = max(int(math.ceil((self.max_x - self.min_x) / cell_size)), 1)
+        self.num_rows = max(int(math.ceil((self.max_z - self.min_z) / cell_size)), 1)
+
+        # Room indices overlapping each grid cell
+        cells = [[] for _ in range(self.num_rows * self.num_cols)]
+        for room_idx, r in enumerate(rooms):
+            i0, j0 = self._cell_coords(r.min_x, r.min_z)
+            i1, j1 = self._cell_coords(r.max_x, r.max_z)
+            for j in range(j0, j1 + 1):
+                for i in range(i0, i1 + 1):
+                    cells[j * self.num_cols + i].append(room_idx)
+
+        # Candidate table of shape (num_cells, K), padded with -1
+        max_cands = max(len(c) for c in cells)
+        self.cell_rooms = np.full((len(cells), max(max_cands, 1)), -1, dtype=int)
+        for cell_idx, c in enumerate(cells):
+            self.cell_rooms[cell_idx, : len(c)] = c
+
+        # Room outlines and edge normals, padded to the largest room,
+        # with one extra "null" room at index -1 for empty candidate slots
+        max_walls = max(r.num_walls for r in rooms)
+        self.outlines = np.zeros((len(rooms) + 1, max_walls, 3))
+        self.edge_norms = np.zeros((len(rooms) + 1, max_walls, 3))
+        self.edge_valid = np.zeros((len(rooms) + 1, max_walls), dtype=bool)
+        for room_idx, r in enumerate(rooms):
+            self.outlines[room_idx, : r.num_walls] = r.outline
+            self.edge_norms[room_idx, : r.num_walls] = r.edge_norms
+            self.edge_valid[room_idx, : r.num_walls] = True
+
+    def _cell_coords(self, x, z):
+        i = int((x - self.min_x) / self.cell_size)
+        j = int((z - self.min_z) / self.cell_size)
+        return min(max(i, 0), self.num_cols - 1), min(max(j, 0), self.num_rows - 1)
+
+    def _inside_mask(self, points):
+        """
+        Test each point against its candidate rooms
+        Returns the candidate table of shape (N, K) and an inside mask
+        """
+
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        px = points[:, 0]
+        pz = points[:, 2]
+
+        i = np.floor((px - self.min_x) / self.cell_size).astype(int)
+        j = np.floor((pz - self.min_z) / self.cell_size).astype(int)
+        in_grid = (i >= 0) & (i < self.num_cols) & (j >= 0) & (j < self.num_rows)
+        cell_idx = np.clip(j, 0, self.num_rows - 1) * self.num_cols + np.clip(
+            i, 0, self.num_cols - 1
+        )
+
+        # Candidate rooms for each point, shape (N, K)
+        cands = self.cell_rooms[cell_idx]
+        cands[~in_grid] = -1
+
+        # Same test as Room.point_inside, for all candidates at once
+        ap = points[:, None, None, :] - self.outlines[cands]
+        dotNAP = np.sum(self.edge_norms[cands] * ap, axis=-1)
+        inside = np.all((dotNAP > 0) | ~self.edge_valid[cands], axis=-1)
+        inside &= cands >= 0
+
+        return cands, inside
+
+    def rooms_at(self, p):
+        """
+        Get the list of rooms containing a point
+        """
+
+        cands, inside = self._inside_mask(p)
+        return [self.rooms[idx] for idx in cands[0][inside[0]]]
+
+    def room_at(self, p):
+        """
+        Get the room containing a point, or None if the point is
+        outside of every room
+        """
+
+        rooms = self.rooms_at(p)
+        return rooms[0] if len(rooms) > 0 else None
+
+    def room_indices(self, points):
+        """
+        Get the index of the room containing each point in a batch
+        Points have shape (N, 3), the result has shape (N,) and
+        contains -1 for points outside of every room
+        """
+
+        cands, inside = self._inside_mask(points)
+        first = np.argmax(inside, axis=1)
+        idxs = cands[np.arange(cands.shape[0]), first]
+        return np.where(np.any(inside, axis=1), idxs, -1)
+
+
+class GainSchedule:
+    """
+    Motor gains of the sections of a hallway along the X axis.
+
+    Sections are delimited by sorted X positions, so finding the section
+    of a position is a binary search. Positions can be looked up one at
+    a time, or as arrays when stepping batches of hallways.
+    """
+
+    def __init__(self, limits, gains, glitches=None):
+        """
+        limits   -- sorted X positions of the N + 1 section boundaries
+        gains    -- motor gain of each of the N sections
+        glitches -- X offset applied to the agent when entering each section
+        """
+
+        assert len(limits) == len(gains) + 1
+        assert all(a <= b for a, b in zip(limits, limits[1:]))
+
+        # Only the inner boundaries are searched, so that positions
+        # outside of the hallway fall in the first or last section
+        self.bounds = [float(x) for x in limits[1:-1]]
+        self.gains = np.array(gains, dtype=float)
+        if glitches is None:
+            glitches = np.zeros(len(gains))
+        self.glitches = np.array(glitches, dtype=float)
+        assert self.glitches.shape == self.gains.shape
+
+    def __len__(self):
+        return len(self.gains)
+
+    def section(self, x):
+        """
+        Get the index of the section containing a position
+        """
+
+        return bisect.bisect_right(self.bounds, x)
+
+    def sections(self, xs):
+        """
+        Get the indices of the sections containing an array of positions
+        """
+
+        return np.searchsorted(self.bounds, xs, side="right")
+
+    def with_gain(self, section, gain):
+        """
+        Get a copy of the schedule with the gain of a section replaced
+        """
+
+        schedule = copy.copy(self)
+        schedule.gains = self.gains.copy()
+        schedule.gains[section] = gain
+        return schedule
+
+
+# Attributes of MiniWorldEnv which are not part of layout descriptions,
+# even if they are set while generating the world
+LAYOUT_BASE_ATTRS = {
+    "agent",
+    "entities",
+    "rooms",
+    "wall_segs",
+    "room_probs",
+    "room_index",
+    "nav_grid",
+    "world_version",
+    "_placements",
+    "_np_random",
+}
+
+# Attributes of MiniWorldEnv which are not part of simulation states,
+# because they hold rendering or process resources
+STATE_EXCLUDED_ATTRS = {
+    "gl",
+    "obs_fb",
+    "vis_fb",
+    "text_label",
+    "window",
+    "static_list",
+    "obs_buffer",
+    "planned_move",
+    "layout_pool",
+    "obs_cache",
+    "world_version",
+    "_obs_key",
+    "_obs_frame",
+    "_np_random",
+}
+
+
+def _copy_state_value(value):
+    """
+    Copy a value of a simulation state, one level deep, so that entities
+    and rooms are still shared but lists and arrays can be modified
+    """
+
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
 class MiniWorldEnv(gym.Env):
     """
     Base class for MiniWorld environments. Implements the procedural
@@ -449,6 +688,10 @@ class MiniWorldEnv(gym.Env):
         "render_fps": 30,
     }
 
+    # Names of the attributes _gen_world modifies in place rather than
+    # setting, such as lists created in __init__, to include in layouts
+    layout_attrs = []
+
     # Enumeration of possible actions
     class Actions(IntEnum):
         # Turn left or right by a small amount
@@ -483,21 +726,44 @@ class MiniWorldEnv(gym.Env):
         domain_rand: bool = False,
         render_mode: Optional[str] = None,
         view: str = "agent",
+        obs_mode: str = "rgb",
+        max_state_entities: int = 8,
     ):
         
         # speed gain parameters, can be change whenever needed 
         self.gain = 1
 
+        # Gains applied by section of the hallway, overriding self.gain
+        # (change_gain then replaces the gain of the current section)
+        self.gain_schedule = None
+
         # Action enumeration for this environment
         self.actions = MiniWorldEnv.Actions
 
         # Actions are discrete integer values
         self.action_space = spaces.Discrete(len(self.actions))
 
-        # Observations are RGB images with pixels in [0, 255]
-        self.observation_space = spaces.Box(
-            low=0, high=255, shape=(obs_height, obs_width, 3), dtype=np.uint8
-        )
+        # Observation type, either RGB images rendered from the point of
+        # view of the agent, or state vectors computed without rendering
+        assert obs_mode in ["rgb", "state"]
+        self.obs_mode = obs_mode
+
+        # Maximum number of entities described in state vectors
+        self.max_state_entities = max_state_entities
+
+        if obs_mode == "rgb":
+            # Observations are RGB images with pixels in [0, 255]
+            self.observation_space = spaces.Box(
+                low=0, high=255, shape=(obs_height, obs_width, 3), dtype=np.uint8
+            )
+        else:
+            # Observations are state vectors, see state_vector()
+            self.observation_space = spaces.Box(
+                low=-math.inf,
+                high=math.inf,
+                shape=(10 + 3 * max_state_entities,),
+                dtype=np.float32,
+            )
 
         self.reward_range = (-math.inf, math.inf)
 
@@ -513,18 +779,58 @@ class MiniWorldEnv(gym.Env):
         # Window for displaying the environment to humans
         self.window = None
 
-        # Invisible window to render into (shadow OpenGL context)
-        self.shadow_window = pyglet.window.Window(width=1, height=1, visible=False)
-
-        # Enable depth testing and backface culling
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_CULL_FACE)
-
-        # Frame buffer used to render observations
-        self.obs_fb = FrameBuffer(obs_width, obs_height, 8)
-
-        # Frame buffer used for human visualization
-        self.vis_fb = FrameBuffer(window_width, window_height, 16)
+        # Sizes of the frame buffers
+        self.obs_width = obs_width
+        self.obs_height = obs_height
+        self.window_width = window_width
+        self.window_height = window_height
+
+        # OpenGL resources in the context shared by the envs of the
+        # process, and frame buffers, acquired by _init_gl when the env
+        # first renders, so that constructing an env stays cheap
+        self.gl = None
+        self.obs_fb = None
+        self.vis_fb = None
+        self.text_label = None
+
+        # Array observations are written into when set, instead of
+        # allocating a new array for each frame
+        self.obs_buffer = None
+
+        # Move of the next step computed ahead by a vector env, as the
+        # key of the move it was computed for, the next position of the
+        # agent, and whether the move is blocked
+        self.planned_move = None
+
+        # Entity placements made by _gen_world, while it runs
+        self._placements = None
+
+        # Names of the attributes set by _gen_world
+        self._layout_attrs = []
+
+        # Optional LayoutPool providing pregenerated layouts on reset
+        self.layout_pool = None
+
+        # Optional ObsCache memoizing the rendered observations,
+        # and version of the static world the cached observations refer to
+        self.obs_cache = None
+        self.static_version = None
+
+        # Version of the visible state of the world, increased whenever
+        # something visible may have changed, and key and copy of the last
+        # observation rendered, returned again while nothing changes
+        self.world_version = 0
+        self._obs_key = None
+        self._obs_frame = None
+
+        # Placements and entities of the current layout, used to start
+        # new episodes in the same layout
+        self._layout_placements = None
+        self._layout_entities = None
+
+        # Display list for the static parts of the world, allocated on
+        # the first call to _render_static
+        self.static_list = None
 
         # Set rendering mode
         self.render_mode = render_mode
@@ -537,19 +843,32 @@ class MiniWorldEnv(gym.Env):
         self.obs_disp_width = 256
         self.obs_disp_height = obs_height * (self.obs_disp_width / obs_width)
 
+        # The world is generated by the first call to reset
+
+    def _init_gl(self):
+        """
+        Acquire the shared OpenGL context and the frame buffers used for rendering
+        """
+
+        self.gl = GLResources()
+        self.gl.switch_to()
+
+        # Frame buffer used to render observations
+        self.obs_fb = self.gl.frame_buffer(self.obs_width, self.obs_height, 8)
+
+        # Frame buffer used for human visualization
+        self.vis_fb = self.gl.frame_buffer(self.window_width, self.window_height, 16)
+
         # For displaying text
         self.text_label = pyglet.text.Label(
             font_name="Arial",
             font_size=14,
             multiline=True,
             width=400,
-            x=window_width + 5,
-            y=window_height - (self.obs_disp_height + 19),
+            x=self.window_width + 5,
+            y=self.window_height - (self.obs_disp_height + 19),
         )
 
-        # Initialize the state
-        self.reset()
-
     def reset(
         self, *, seed: Optional[int] = None, options: Optional[dict] = None
     ) -> Tuple[ObsType, dict]:
@@ -562,24 +881,31 @@ class MiniWorldEnv(gym.Env):
         # Step count since episode start
         self.step_count = 0
 
-        # Create the agent
-        self.agent = Agent()
+        # Reuse the layout of the previous episode, if there is one
+        keep_layout = (
+            options is not None
+            and options.get("keep_same_env", False)
+            and self._layout_entities is not None
+        )
 
-        # List of entities contained
-        self.entities = []
+        if keep_layout:
+            # Restore the entities of the layout, except those which were
+            # placed by _gen_world and are placed again below
+            self.agent.carrying = None
+            placed = set(id(ent) for ent, _ in self._layout_placements)
+            self.entities = []
+            for ent, pos, dir in self._layout_entities:
+                if id(ent) not in placed:
+                    ent.pos = pos.copy()
+                    ent.dir = dir
+                    self.entities.append(ent)
 
-        # List of rooms in the world
-        self.rooms = []
-
-        # Wall segments for collision detection
-        # Shape is (N, 2, 3)
-        self.wall_segs = []
-
-        # Generate the world
-        if (options is not None) and options['keep_same_env']:
             self._gen_world_same_env()
-        else :
-            self._gen_world()
+        elif self.layout_pool is not None:
+            # Instantiate a layout pregenerated in the background
+            self._set_layout(self.layout_pool.get())
+        else:
+            self._gen_layout()
 
         # Check if domain randomization is enabled or not
         rand = self.np_random if self.domain_rand else None
@@ -593,8 +919,11 @@ class MiniWorldEnv(gym.Env):
         self.max_forward_step = self.params.get_max("forward_step")
 
         # Randomize parameters of the entities
+        # Static entities are compiled into the display list,
+        # so they are left as is when keeping the layout
         for ent in self.entities:
-            ent.randomize(self.params, rand)
+            if not (keep_layout and ent.is_static):
+                ent.randomize(self.params, rand)
 
         # Compute the min and max x, z extents of the whole floorplan
         self.min_x = min(r.min_x for r in self.rooms)
@@ -606,29 +935,107 @@ class MiniWorldEnv(gym.Env):
         if len(self.wall_segs) == 0:
             self._gen_static_data()
 
+        # Snapshot of the layout, from which the next episodes can start
+        if not keep_layout:
+            self._layout_placements = [
+                (ent, kwargs) for ent, kwargs in self._placements if not ent.is_static
+            ]
+            self._layout_entities = [
+                (ent, np.array(ent.pos, dtype=float), ent.dir) for ent in self.entities
+            ]
+            self._placements = None
+
+        # Agent displacement during the last step
+        self.agent_vel = np.zeros(3)
+
+        # Pre-draw the motion parameters of the steps of the episode
+        self._draw_tape()
+
+        self.world_version += 1
+
         # Pre-compile static parts of the environment into a display list
-        self._render_static()
+        if self.gl is not None:
+            if not keep_layout or self.static_list is None:
+                self._render_static()
 
-        # Generate the first camera image
-        obs = self.render_obs()
+        # Generate the first observation
+        obs = self._get_obs()
 
         # Return first observation
         return obs, {}
     
+    def get_state(self):
+        """
+        Capture the state of the simulation: agent and entity poses,
+        carried object, step count, gain, random number generator state,
+        randomized parameters and task attributes. The world itself is
+        referenced rather than copied, so the state is cheap to capture
+        and can be restored any number of times with set_state.
+        """
+
+        return {
+            "env": {
+                name: _copy_state_value(value)
+                for name, value in self.__dict__.items()
+                if name not in STATE_EXCLUDED_ATTRS
+            },
+            "entities": [
+                (ent, {k: _copy_state_value(v) for k, v in ent.__dict__.items()})
+                for ent in set(self.entities + [self.agent])
+            ],
+            "rng": copy.deepcopy(self.np_random.bit_generator.state),
+        }
+
+    def set_state(self, state):
+        """
+        Restore a state captured with get_state, and return the
+        corresponding observation. The static geometry is only compiled
+        again if the state belongs to another layout.
+        Note: this restores the state of the unwrapped env only.
+        """
+
+        # Rooms are copied into states, so layouts are compared room by room
+        rooms = state["env"]["rooms"]
+        same_layout = len(rooms) == len(self.rooms) and all(
+            a is b for a, b in zip(rooms, self.rooms)
+        )
+
+        for name, value in state["env"].items():
+            setattr(self, name, _copy_state_value(value))
+
+        for ent, ent_state in state["entities"]:
+            ent.__dict__.update({k: _copy_state_value(v) for k, v in ent_state.items()})
+
+        self.np_random.bit_generator.state = copy.deepcopy(state["rng"])
+        self.world_version += 1
+
+        if self.gl is not None and not same_layout:
+            self._render_static()
+
+        return self._get_obs()
+
     def change_gain(self,random = True, 
                         gain = None,
                         motor_gains=[0.5,1,1.5],
                         glitch=False,
                         glitch_phase=0):
+        """
+        Change the motor gain, to a given value or to one drawn from
+        motor_gains, optionally shifting the agent along the X axis.
+        With a gain schedule, the new gain replaces the gain of the
+        section the agent is in, which would otherwise override it on
+        the next step. The schedule is copied rather than modified, so
+        layouts and saved states keep their own gains.
+        """
 
         if random :
-            new_gain = np.random.choice(motor_gains)
+            new_gain = self.np_random.choice(motor_gains)
         else :
             new_gain = gain
 
         if glitch :
             # print('glitch with phase',glitch_phase)
-            pos_agent = self.agent.pos
+            pos_agent = self.agent.pos.copy()
             pos_agent[0] = self.agent.pos[0] + glitch_phase
             self.place_entity(
                     self.agent,
@@ -638,6 +1045,11 @@ class MiniWorldEnv(gym.Env):
                 )
         self.gain = new_gain
 
+        schedule = self.gain_schedule
+        if schedule is not None:
+            section = schedule.section(self.agent.pos[0])
+            self.gain_schedule = schedule.with_gain(section, new_gain)
+
 
     def _get_carry_pos(self, agent_pos, ent):
         """
@@ -658,13 +1070,19 @@ class MiniWorldEnv(gym.Env):
         Move the agent forward
         """
 
-        next_pos = (
-            self.agent.pos
-            + self.agent.dir_vec * fwd_dist
-            + self.agent.right_vec * fwd_drift
-        )
+        planned = self.planned_move
+        self.planned_move = None
+        if planned is not None and planned[0] == self.move_key(fwd_dist, fwd_drift):
+            _, next_pos, blocked = planned
+        else:
+            next_pos = (
+                self.agent.pos
+                + self.agent.dir_vec * fwd_dist
+                + self.agent.right_vec * fwd_drift
+            )
+            blocked = self.intersect(self.agent, next_pos, self.agent.radius)
 
-        if self.intersect(self.agent, next_pos, self.agent.radius):
+        if blocked:
             return False
 
         carrying = self.agent.carrying
@@ -677,9 +1095,24 @@ class MiniWorldEnv(gym.Env):
             carrying.pos = next_carrying_pos
 
         self.agent.pos = next_pos
+        self.world_version += 1
 
         return True
 
+    def move_key(self, fwd_dist, fwd_drift):
+        """
+        Key identifying a move of the agent from its current pose,
+        in the current state of the world
+        """
+
+        return (
+            fwd_dist,
+            fwd_drift,
+            self.world_version,
+            self.agent.pos.tobytes(),
+            self.agent.dir,
+        )
+
     def turn_agent(self, turn_angle):
         """
         Turn the agent left or right
@@ -701,20 +1134,92 @@ class MiniWorldEnv(gym.Env):
             carrying.pos = pos
             carrying.dir = self.agent.dir
 
+        self.world_version += 1
+
         return True
 
+    def _draw_tape(self):
+        """
+        Draw the motion parameters of the next steps into the randomness tape,
+        so that domain randomization costs a single lookup per step
+        """
+
+        rand = self.np_random if self.domain_rand else None
+        length = int(min(self.max_episode_steps, TAPE_LENGTH))
+        self.param_tape = self.params.sample_table(rand, length, STEP_PARAMS)
+        self.tape_start = max(self.step_count - 1, 0)
+
+    def _step_params(self):
+        """
+        Get the motion parameters of the current step from the randomness tape
+        """
+
+        idx = self.step_count - 1 - self.tape_start
+        if idx >= len(self.param_tape):
+            self._draw_tape()
+            idx = 0
+        return self.param_tape[idx]
+
+    def _step_motion(self, pos):
+        """
+        Get the gain, forward step, forward drift and turn step of the
+        current step, for an agent starting it at pos
+        """
+
+        gain = self._gain_at(pos)
+
+        params = self._step_params()
+        fwd_step = params["forward_step"] * gain
+        turn_step = params["turn_step"]  # * self.gain
+
+        return gain, fwd_step, params["forward_drift"], turn_step
+
+    def _gain_at(self, pos):
+        """
+        Get the gain of a step starting at pos: that of the section
+        containing pos if there is a gain schedule, self.gain otherwise
+        """
+
+        schedule = self.gain_schedule
+        if schedule is None:
+            return self.gain
+        return schedule.gains[schedule.section(pos[0])]
+
+    def next_move(self, action):
+        """
+        Get the forward distance and drift the next step will move the
+        agent by for an action, or None if the action doesn't move it
+        """
+
+        if action == self.actions.move_forward:
+            sign = 1
+        elif action == self.actions.move_back:
+            sign = -1
+        else:
+            return None
+
+        # The motion parameters are those of the next step
+        self.step_count += 1
+        try:
+            _, fwd_step, fwd_drift, _ = self._step_motion(self.agent.pos)
+        finally:
+            self.step_count -= 1
+
+        return sign * fwd_step, fwd_drift
+
     def step(self, action):
         """
         Perform one action and update the simulation
         """
         
         self.step_count += 1
-        rand = self.np_random if self.domain_rand else None
-        fwd_drift = self.params.sample(rand, "forward_drift")
+        prev_pos = self.agent.pos.copy()
 
-        fwd_step = self.params.sample(rand, "forward_step") * self.gain
-        turn_step = self.params.sample(rand, "turn_step")  # * self.gain
+        schedule = self.gain_schedule
+        if schedule is not None:
+            section = schedule.section(prev_pos[0])
 
+        self.gain, fwd_step, fwd_drift, turn_step = self._step_motion(prev_pos)
 
         if action == self.actions.move_forward:
             self.move_agent(fwd_step, fwd_drift)
@@ -743,28 +1248,47 @@ class MiniWorldEnv(gym.Env):
             if self.agent.carrying:
                 self.agent.carrying.pos[1] = 0
                 self.agent.carrying = None
+                self.world_version += 1
+
+        info = {}
+        if schedule is not None:
+            # Entering a section shifts the agent by its glitch offset
+            new_section = schedule.section(self.agent.pos[0])
+            offset = schedule.glitches[new_section]
+            if new_section != section and offset != 0:
+                pos = self.agent.pos + np.array([offset, 0, 0])
+                if not self.intersect(self.agent, pos, self.agent.radius):
+                    self.agent.pos = pos
+                    prev_pos[0] += offset
+                    self.world_version += 1
+
+            info["section"] = new_section
+            info["gain"] = self.gain
 
         # If we are carrying an object, update its position as we move
         if self.agent.carrying:
             ent_pos = self._get_carry_pos(self.agent.pos, self.agent.carrying)
             self.agent.carrying.pos = ent_pos
             self.agent.carrying.dir = self.agent.dir
+            self.world_version += 1
 
-        # Generate the current camera image
-        obs = self.render_obs()
+        self.agent_vel = self.agent.pos - prev_pos
+
+        # Generate the current observation
+        obs = self._get_obs()
 
         # If the maximum time step count is reached
         if self.step_count >= self.max_episode_steps:
             termination = False
             truncation = True
             reward = 0
-            return obs, reward, termination, truncation, {}
+            return obs, reward, termination, truncation, info
 
         reward = 0
         termination = False
         truncation = False
 
-        return obs, reward, termination, truncation, {}
+        return obs, reward, termination, truncation, info
 
     def add_rect_room(self, min_x, max_x, min_z, max_z, **kwargs):
         """
@@ -892,6 +1416,21 @@ class MiniWorldEnv(gym.Env):
         assert len(self.rooms) > 0, "create rooms before calling place_entity"
         assert ent.radius is not None, "entity must have physical size defined"
 
+        self.world_version += 1
+
+        # Record the placement so it can be replayed in the same layout
+        if self._placements is not None:
+            kwargs = dict(
+                room=room,
+                pos=None if pos is None else np.array(pos, dtype=float),
+                dir=dir,
+                min_x=min_x,
+                max_x=max_x,
+                min_z=min_z,
+                max_z=max_z,
+            )
+            self._placements.append((ent, kwargs))
+
         # Generate collision detection data
         if len(self.wall_segs) == 0:
             self._gen_static_data()
@@ -991,6 +1530,14 @@ class MiniWorldEnv(gym.Env):
 
         return None
 
+    def room_at(self, pos):
+        """
+        Get the room containing a given position, or None if the
+        position is outside of every room
+        """
+
+        return self.room_index.room_at(pos)
+
     def near(self, ent0, ent1=None):
         """
         Test if the two entities are near each other.
@@ -1003,6 +1550,104 @@ class MiniWorldEnv(gym.Env):
         dist = np.linalg.norm(ent0.pos - ent1.pos)
         return dist < ent0.radius + ent1.radius + 1.1 * self.max_forward_step
 
+    def memory_report(self):
+        """
+        Report the memory used by this env and by the frame buffers,
+        textures and meshes shared with the other envs of the process,
+        in host bytes and estimated GL bytes
+        """
+
+        return memory_report(self)
+
+    def get_nav_grid(self):
+        """
+        Get the navigation grid for the current layout, building it
+        the first time it is needed
+        """
+
+        if self.nav_grid is None:
+            # Static entities are obstacles, the others can be moved
+            obstacles = [
+                (ent.pos, ent.radius)
+                for ent in self.entities
+                if ent.is_static and ent.radius > 0
+            ]
+            self.nav_grid = NavGrid(
+                self.room_index, self.wall_segs, self.agent.radius, obstacles
+            )
+
+        return self.nav_grid
+
+    def distance_to(self, target, pos=None):
+        """
+        Shortest path distance from a position (by default, the agent
+        position) to a target entity or position, going around walls
+        and static obstacles. Returns inf if the target is unreachable.
+        """
+
+        if isinstance(target, Entity):
+            target = target.pos
+        if pos is None:
+            pos = self.agent.pos
+
+        return self.get_nav_grid().distance(target, pos)
+
+    def best_action(self, target):
+        """
+        Action moving the agent along a shortest path to a target
+        entity or position. Useful as an oracle/expert policy.
+        Returns None if the target is unreachable.
+        """
+
+        if isinstance(target, Entity):
+            target = target.pos
+
+        if not np.isfinite(self.distance_to(target)):
+            return None
+
+        fwd_step = self.params.sample(None, "forward_step") * self._gain_at(
+            self.agent.pos
+        )
+        turn_step = self.params.sample(None, "turn_step") * math.pi / 180
+
+        # Directions the agent can face after turning k times
+        max_turns = int(math.ceil(math.pi / turn_step))
+        turns = np.arange(-max_turns, max_turns + 1)
+        angles = self.agent.dir + turns * turn_step
+
+        # Distance left after moving along each direction
+        dists = self.get_nav_grid().ray_distances(
+            target, self.agent.pos, angles, lookahead=max(fwd_step, 0.5)
+        )
+
+        # Directions where the next step would be blocked are not an option
+        for k, angle in enumerate(angles):
+            if np.isfinite(dists[k]):
+                dir_vec = np.array([math.cos(angle), 0, -math.sin(angle)])
+                next_pos = self.agent.pos + dir_vec * fwd_step
+                if self.intersect(self.agent, next_pos, self.agent.radius):
+                    dists[k] = np.inf
+
+        # Each turn costs one time step, worth one forward step
+        costs = dists + np.abs(turns) * fwd_step
+
+        if not np.any(np.isfinite(costs)):
+            # Close enough to head straight for the target
+            heading = math.atan2(
+                -(target[2] - self.agent.pos[2]), target[0] - self.agent.pos[0]
+            )
+            diff = (heading - self.agent.dir + math.pi) % (2 * math.pi) - math.pi
+            if abs(diff) <= turn_step / 2:
+                return self.actions.move_forward
+            return self.actions.turn_left if diff > 0 else self.actions.turn_right
+
+        k = turns[np.argmin(costs)]
+        if k > 0:
+            return self.actions.turn_left
+        if k < 0:
+            return self.actions.turn_right
+        return self.actions.move_forward
+
     def _load_tex(self, tex_name):
         """
         Load a texture, with or without domain randomization
@@ -1031,13 +1676,111 @@ class MiniWorldEnv(gym.Env):
         self.room_probs = np.array([r.area for r in self.rooms], dtype=float)
         self.room_probs /= np.sum(self.room_probs)
 
+        # Point location index, to find which room a point is in
+        self.room_index = RoomIndex(self.rooms)
+
     def _gen_world(self):
         """
         Generate the world. Derived classes must implement this method.
+
+        The attributes set by this method are part of the layout, reused
+        by keep_same_env resets and layout pools. Attributes it modifies
+        in place must be listed in layout_attrs.
         """
 
         raise NotImplementedError
 
+    def _gen_layout(self):
+        """
+        Generate a new layout for the world, from scratch
+        """
+
+        # Create the agent
+        self.agent = Agent()
+
+        # List of entities contained
+        self.entities = []
+
+        # List of rooms in the world
+        self.rooms = []
+
+        # Wall segments for collision detection
+        # Shape is (N, 2, 3)
+        self.wall_segs = []
+
+        # Navigation grid, built on demand for this layout
+        self.nav_grid = None
+
+        # Generate the world, recording the placements of entities
+        # and the attributes set by _gen_world
+        attrs = dict(self.__dict__)
+        self._placements = []
+        self._gen_world()
+        self._layout_attrs = [
+            name
+            for name, value in self.__dict__.items()
+            if name not in LAYOUT_BASE_ATTRS
+            and (
+                name in self.layout_attrs
+                or name not in attrs
+                or attrs[name] is not value
+            )
+        ]
+
+    def _get_layout(self):
+        """
+        Get a serializable description of the layout generated by
+        _gen_layout: rooms, portals, entity placements, and the
+        attributes set by _gen_world (which may reference rooms and
+        entities). The collision data generated along with the world is
+        included, so that it doesn't have to be generated again.
+        """
+
+        if len(self.wall_segs) == 0:
+            self._gen_static_data()
+
+        return {
+            "agent": self.agent,
+            "entities": self.entities,
+            "rooms": self.rooms,
+            "wall_segs": self.wall_segs,
+            "room_probs": self.room_probs,
+            "room_index": self.room_index,
+            "placements": self._placements,
+            "attrs": {name: getattr(self, name) for name in self._layout_attrs},
+        }
+
+    def _set_layout(self, layout):
+        """
+        Instantiate a layout description produced by _get_layout
+        """
+
+        self.agent = layout["agent"]
+        self.entities = layout["entities"]
+        self.rooms = layout["rooms"]
+        self.wall_segs = layout["wall_segs"]
+        self.room_probs = layout["room_probs"]
+        self.room_index = layout["room_index"]
+        self._placements = layout["placements"]
+        self.__dict__.update(layout["attrs"])
+
+        # Navigation grid, built on demand for this layout
+        self.nav_grid = None
+
+    def _gen_world_same_env(self):
+        """
+        Place the agent and the dynamic entities again, in the layout
+        generated for a previous episode. By default, the placements made
+        by _gen_world are replayed, drawing new random positions and
+        directions wherever these were random.
+        """
+
+        for ent, kwargs in self._layout_placements:
+            kwargs = dict(kwargs)
+            if kwargs["pos"] is not None:
+                kwargs["pos"] = kwargs["pos"].copy()
+            self.place_entity(ent, **kwargs)
+
     def _reward(self):
         """
         Default sparse reward computation
@@ -1051,19 +1794,19 @@ class MiniWorldEnv(gym.Env):
         Called once at the beginning of each episode.
         """
 
-        # TODO: manage this automatically
-        # glIsList
-        glDeleteLists(1, 1)
-        glNewList(1, GL_COMPILE)
+        self.gl.switch_to()
 
-        # Light position
-        glLightfv(GL_LIGHT0, GL_POSITION, (GLfloat * 4)(*self.light_pos + [1]))
+        # Observations rendered before are no longer valid
+        self.static_version = next(STATIC_VERSIONS)
 
-        # Background/minimum light level
-        glLightfv(GL_LIGHT0, GL_AMBIENT, (GLfloat * 4)(*self.light_ambient))
+        # Each environment compiles into its own display list, since
+        # display lists are shared between all the contexts of a process
+        if self.static_list is None:
+            self.static_list = self.gl.gen_list()
+        glNewList(self.static_list, GL_COMPILE)
 
-        # Diffuse light color
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, (GLfloat * 4)(*self.light_color))
+        # Note: the light parameters are set in _render_world, so that
+        # they can be randomized without recompiling the display list
 
         # glLightf(GL_LIGHT0, GL_SPOT_CUTOFF, 180)
         # glLightf(GL_LIGHT0, GL_SPOT_EXPONENT, 0)
@@ -1090,14 +1833,23 @@ class MiniWorldEnv(gym.Env):
 
         glEndList()
 
-    def _render_world(self, frame_buffer, render_agent):
+    def _render_world(self, frame_buffer, render_agent, out=None):
         """
         Render the world from a given camera position into a frame buffer,
         and produce a numpy image array as output.
         """
 
+        # Light position
+        glLightfv(GL_LIGHT0, GL_POSITION, (GLfloat * 4)(*self.light_pos + [1]))
+
+        # Background/minimum light level
+        glLightfv(GL_LIGHT0, GL_AMBIENT, (GLfloat * 4)(*self.light_ambient))
+
+        # Diffuse light color
+        glLightfv(GL_LIGHT0, GL_DIFFUSE, (GLfloat * 4)(*self.light_color))
+
         # Call the display list for the static parts of the environment
-        glCallList(1)
+        glCallList(self.static_list)
 
         # TODO: keep the non-static entities in a different list for efficiency?
         # Render the non-static entities
@@ -1110,7 +1862,7 @@ class MiniWorldEnv(gym.Env):
             self.agent.render()
 
         # Resolve the rendered image into a numpy array
-        img = frame_buffer.resolve()
+        img = frame_buffer.resolve(out)
 
         return img
 
@@ -1119,12 +1871,13 @@ class MiniWorldEnv(gym.Env):
         Render a top view of the whole map (from above)
         """
 
+        # Switch to the default OpenGL context, creating it if needed
+        # This is necessary on Linux Nvidia drivers
+        self._make_current()
+
         if frame_buffer is None:
             frame_buffer = self.obs_fb
-
-        # Switch to the default OpenGL context
-        # This is necessary on Linux Nvidia drivers
-        self.shadow_window.switch_to()
+            self._obs_key = None
 
         # Bind the frame buffer before rendering into it
         frame_buffer.bind()
@@ -1190,17 +1943,121 @@ class MiniWorldEnv(gym.Env):
 
         return self._render_world(frame_buffer, render_agent=True)
 
+    def _make_current(self):
+        """
+        Switch to the OpenGL context of the env, creating it if needed
+        """
+
+        if self.gl is None:
+            self._init_gl()
+            self._render_static()
+
+        self.gl.switch_to()
+
+    def _get_obs(self):
+        """
+        Produce an observation of the current state, according to obs_mode
+        """
+
+        if self.obs_mode == "state":
+            return self.state_vector()
+
+        if self.obs_cache is None:
+            return self.render_obs()
+
+        # The static world is rendered before the key is computed,
+        # so that the key refers to its current version
+        self._make_current()
+        key = self.obs_cache.key(self)
+        obs = self.obs_cache.get(key)
+        if obs is None:
+            obs = self.render_obs()
+            self.obs_cache.put(key, obs.copy())
+        elif self.obs_buffer is not None:
+            np.copyto(self.obs_buffer, obs)
+            obs = self.obs_buffer
+        else:
+            obs = obs.copy()
+
+        return obs
+
+    def state_vector(self):
+        """
+        Compact vector describing the state of the world, without rendering:
+        - agent position (x, z) and direction (cos, sin)
+        - agent displacement (x, z) during the last step
+        - motor gain
+        - carrying flag and position (x, z) of the carried entity
+        - position (x, z) and presence flag of the first max_state_entities
+          entities other than the agent, padded with zeros
+        """
+
+        state = np.zeros(10 + 3 * self.max_state_entities, dtype=np.float32)
+
+        agent = self.agent
+        state[0] = agent.pos[0]
+        state[1] = agent.pos[2]
+        state[2] = math.cos(agent.dir)
+        state[3] = math.sin(agent.dir)
+        state[4] = self.agent_vel[0]
+        state[5] = self.agent_vel[2]
+        state[6] = self.gain
+
+        if agent.carrying:
+            state[7] = 1
+            state[8] = agent.carrying.pos[0]
+            state[9] = agent.carrying.pos[2]
+
+        ents = [ent for ent in self.entities if ent is not agent]
+        for idx, ent in enumerate(ents[: self.max_state_entities]):
+            state[10 + 3 * idx] = ent.pos[0]
+            state[11 + 3 * idx] = ent.pos[2]
+            state[12 + 3 * idx] = 1
+
+        return state
+
+    def invalidate_obs(self):
+        """
+        Render the next observation again, instead of reusing the last
+        one, as if something visible changed
+        """
+
+        self.world_version += 1
+
     def render_obs(self, frame_buffer=None):
         """
         Render an observation from the point of view of the agent
         """
 
+        # Switch to the default OpenGL context, creating it if needed
+        # This is necessary on Linux Nvidia drivers
+        self._make_current()
+
+        out = None
+        key = None
         if frame_buffer is None:
             frame_buffer = self.obs_fb
+            out = self.obs_buffer
+
+        if frame_buffer is self.obs_fb:
+            # The agent pose and the list of entities are part of the key,
+            # since env code may move the agent or remove entities directly
+            key = (
+                self.world_version,
+                self.static_version,
+                self.agent.pos.tobytes(),
+                self.agent.dir,
+                tuple(map(id, self.entities)),
+            )
 
-        # Switch to the default OpenGL context
-        # This is necessary on Linux Nvidia drivers
-        self.shadow_window.switch_to()
+            # Nothing visible changed since the last observation, and
+            # nothing else was rendered into the frame buffer since
+            if key == self._obs_key and key == frame_buffer.key:
+                if out is None:
+                    return self._obs_frame.copy()
+                if self._obs_frame is not out:
+                    np.copyto(out, self._obs_frame)
+                return out
 
         # Bind the frame buffer before rendering into it
         frame_buffer.bind()
@@ -1234,7 +2091,14 @@ class MiniWorldEnv(gym.Env):
             0.0,
         )
 
-        return self._render_world(frame_buffer, render_agent=False)
+        obs = self._render_world(frame_buffer, render_agent=False, out=out)
+
+        if key is not None:
+            self._obs_key = key
+            self._obs_frame = obs if out is not None else obs.copy()
+            frame_buffer.key = key
+
+        return obs
 
     def render_depth(self, frame_buffer=None):
         """
@@ -1243,12 +2107,12 @@ class MiniWorldEnv(gym.Env):
         Distances are in meters from the observer
         """
 
-        if frame_buffer is None:
-            frame_buffer = self.obs_fb
-
         # Render the world
         self.render_obs(frame_buffer)
 
+        if frame_buffer is None:
+            frame_buffer = self.obs_fb
+
         return frame_buffer.get_depth_map(0.04, 100.0)
 
     def get_visible_ents(self):
@@ -1258,14 +2122,12 @@ class MiniWorldEnv(gym.Env):
         :return: set of objects visible to the agent
         """
 
-        # Allocate the occlusion query ids
-        num_ents = len(self.entities)
-        query_ids = (GLuint * num_ents)()
-        glGenQueries(num_ents, query_ids)
-
         # Switch to the default OpenGL context
         # This is necessary on Linux Nvidia drivers
-        self.shadow_window.switch_to()
+        self._make_current()
+
+        # Occlusion query ids, reused across calls
+        query_ids = self.gl.queries(len(self.entities))
 
         # Use the small observation frame buffer
         frame_buffer = self.obs_fb
@@ -1340,15 +2202,21 @@ class MiniWorldEnv(gym.Env):
             if visible[0] != 0:
                 vis_objs.add(ent)
 
-        # Free the occlusion query ids
-        glDeleteQueries(1, query_ids)
-
         # img = frame_buffer.resolve()
         # return img
 
         return vis_objs
 
     def close(self):
+        # Free the display list and the frame buffers of the env, and
+        # the shared context if no other env uses it
+        if self.gl is not None:
+            self.gl.release()
+            self.gl = None
+            self.obs_fb = None
+            self.vis_fb = None
+            self.static_list = None
+            self._obs_key = None
         if self.window:
             self.window.close()
         return
@@ -1366,6 +2234,9 @@ class MiniWorldEnv(gym.Env):
             )
             return
 
+        # Create the OpenGL context if the env was not rendered yet
+        self._make_current()
+
         # Render the human-view image
         if self.view == "agent":
             img = self.render_obs(self.vis_fb)
@@ -0,0 +1,242 @@
+import heapq
+import math
+
+import numpy as np
+
+# Offsets to the 8 neighbors of a grid cell, as (di, dj, cost)
+NEIGHBORS = [
+    (1, 0, 1.0),
+    (-1, 0, 1.0),
+    (0, 1, 1.0),
+    (0, -1, 1.0),
+    (1, 1, math.sqrt(2)),
+    (1, -1, math.sqrt(2)),
+    (-1, 1, math.sqrt(2)),
+    (-1, -1, math.sqrt(2)),
+]
+
+
+class NavGrid:
+    """
+    Occupancy grid over the floorplan of a world, with geodesic distance
+    fields to goal positions. Distance fields are computed once per goal
+    and cached, so distance queries are simple array lookups.
+
+    A cell is free if an agent of the given radius centered on it does
+    not touch any wall or static obstacle.
+    """
+
+    def __init__(self, room_index, wall_segs, radius, obstacles=(), resolution=0.2):
+        """
+        room_index -- RoomIndex of the world
+        wall_segs  -- wall segments of shape (N, 2, 3)
+        radius     -- radius of the agent navigating the grid
+        obstacles  -- list of (pos, radius) static obstacle footprints
+        resolution -- size of a grid cell, in meters
+        """
+
+        self.radius = radius
+        self.resolution = resolution
+
+        # Keep paths half a cell further from walls than strictly needed,
+        # to account for the discretization of positions
+        clearance = radius + resolution / 2
+
+        self.min_x = room_index.min_x
+        self.min_z = room_index.min_z
+        self.num_cols = max(
+            int(math.ceil((room_index.max_x - room_index.min_x) / resolution)), 1
+        )
+        self.num_rows = max(
+            int(math.ceil((room_index.max_z - room_index.min_z) / resolution)), 1
+        )
+
+        # Positions of the cell centers
+        self.xs = self.min_x + (np.arange(self.num_cols) + 0.5) * resolution
+        self.zs = self.min_z + (np.arange(self.num_rows) + 0.5) * resolution
+        gx, gz = np.meshgrid(self.xs, self.zs)
+
+        # Cells whose center lies inside of a room
+        # Centers are nudged both ways so that cells centered exactly on
+        # the boundary between two touching rooms are not left out
+        centers = np.stack([gx.ravel(), np.zeros(gx.size), gz.ravel()], axis=1)
+        self.cell_rooms = np.full(gx.shape, -1)
+        for offset in (-1e-6, 1e-6):
+            nudged = centers + np.array([offset, 0, offset])
+            idxs = room_index.room_indices(nudged).reshape(gx.shape)
+            self.cell_rooms = np.where(idxs >= 0, idxs, self.cell_rooms)
+        self.inside = self.cell_rooms >= 0
+
+        # Mark the cells too close to a wall as occupied
+        # Each segment only updates the cells within its bounding box
+        self.occupied = ~self.inside
+        for seg in wall_segs:
+            (ax, _, az), (bx, _, bz) = seg
+            rows, cols = self._window(
+                min(ax, bx) - clearance,
+                max(ax, bx) + clearance,
+                min(az, bz) - clearance,
+                max(az, bz) + clearance,
+            )
+            if rows.stop <= rows.start or cols.stop <= cols.start:
+                continue
+            px = gx[rows, cols] - ax
+            pz = gz[rows, cols] - az
+            abx, abz = bx - ax, bz - az
+            t = np.clip((px * abx + pz * abz) / (abx * abx + abz * abz), 0, 1)
+            dx = px - t * abx
+            dz = pz - t * abz
+            self.occupied[rows, cols] |= dx * dx + dz * dz < clearance * clearance
+
+        # Footprints of the static obstacles
+        for pos, obs_radius in obstacles:
+            r = clearance + obs_radius
+            rows, cols = self._window(pos[0] - r, pos[0] + r, pos[2] - r, pos[2] + r)
+            dx = gx[rows, cols] - pos[0]
+            dz = gz[rows, cols] - pos[2]
+            self.occupied[rows, cols] |= dx * dx + dz * dz < r * r
+
+        self.free = ~self.occupied
+
+        # Cached distance fields, indexed by goal cell
+        self.fields = {}
+
+    def _window(self, min_x, max_x, min_z, max_z):
+        """
+        Get the row and column slices of the cells overlapping a rectangle
+        """
+
+        i0 = max(int(math.floor((min_x - self.min_x) / self.resolution)), 0)
+        i1 = min(int(math.ceil((max_x - self.min_x) / self.resolution)), self.num_cols)
+        j0 = max(int(math.floor((min_z - self.min_z) / self.resolution)), 0)
+        j1 = min(int(math.ceil((max_z - self.min_z) / self.resolution)), self.num_rows)
+        return slice(j0, j1), slice(i0, i1)
+
+    def cell(self, pos):
+        """
+        Get the (row, col) grid cell containing a position
+        """
+
+        i = int((pos[0] - self.min_x) / self.resolution)
+        j = int((pos[2] - self.min_z) / self.resolution)
+        return min(max(j, 0), self.num_rows - 1), min(max(i, 0), self.num_cols - 1)
+
+    def _nearest_free(self, pos):
+        """
+        Find the free cell closest to a position
+        """
+
+        free_js, free_is = np.nonzero(self.free)
+        if len(free_js) == 0:
+            return None
+
+        d2 = (self.xs[free_is] - pos[0]) ** 2 + (self.zs[free_js] - pos[2]) ** 2
+        idx = np.argmin(d2)
+        return free_js[idx], free_is[idx]
+
+    def distance_field(self, goal_pos):
+        """
+        Get the geodesic distance field to a goal position
+        Unreachable cells have an infinite distance
+        """
+
+        goal_cell = self.cell(goal_pos)
+        if goal_cell in self.fields:
+            return self.fields[goal_cell]
+
+        field = np.full((self.num_rows, self.num_cols), np.inf)
+
+        # The goal may lie in an occupied cell (e.g. a box against a wall),
+        # in which case the search starts from the closest free cell
+        start = goal_cell if self.free[goal_cell] else self._nearest_free(goal_pos)
+        if start is None:
+            self.fields[goal_cell] = field
+            return field
+        j, i = start
+        field[j, i] = math.hypot(self.xs[i] - goal_pos[0], self.zs[j] - goal_pos[2])
+
+        # Dijkstra search over the 8-connected grid
+        free = self.free
+        queue = [(field[j, i], j, i)]
+        while queue:
+            d, j, i = heapq.heappop(queue)
+            if d > field[j, i]:
+                continue
+
+            for di, dj, cost in NEIGHBORS:
+                ni = i + di
+                nj = j + dj
+                if ni < 0 or nj < 0 or ni >= self.num_cols or nj >= self.num_rows:
+                    continue
+                if not free[nj, ni]:
+                    continue
+                # Don't cut corners when moving diagonally
+                if di != 0 and dj != 0 and not (free[j, ni] and free[nj, i]):
+                    continue
+
+                nd = d + cost * self.resolution
+                if nd < field[nj, ni]:
+                    field[nj, ni] = nd
+                    heapq.heappush(queue, (nd, nj, ni))
+
+        # Extend the field into the occupied cells near walls, where the
+        # agent center can still be located, so that lookups never fail
+        # Values only spread within a room, so they can't leak through walls
+        num_iters = int(math.ceil(self.radius / self.resolution)) + 2
+        for _ in range(num_iters):
+            grown = field.copy()
+            for di, dj, cost in NEIGHBORS:
+                src_idx = (
+                    slice(max(-dj, 0), self.num_rows - max(dj, 0)),
+                    slice(max(-di, 0), self.num_cols - max(di, 0)),
+                )
+                dst_idx = (
+                    slice(max(dj, 0), self.num_rows - max(-dj, 0)),
+                    slice(max(di, 0), self.num_cols - max(-di, 0)),
+                )
+                same_room = self.cell_rooms[src_idx] == self.cell_rooms[dst_idx]
+                cand = np.where(
+                    same_room, field[src_idx] + cost * self.resolution, np.inf
+                )
+                np.minimum(grown[dst_idx], cand, out=grown[dst_idx])
+            field = np.where(self.occupied & self.inside, grown, field)
+
+        self.fields[goal_cell] = field
+        return field
+
+    def distance(self, goal_pos, pos):
+        """
+        Geodesic distance between a position and a goal position
+        """
+
+        return self.distance_field(goal_pos)[self.cell(pos)]
+
+    def ray_distances(self, goal_pos, pos, angles, lookahead):
+        """
+        Distance to the goal after moving a given distance from a position
+        along each of several direction angles (in radians). Directions
+        which run into an obstacle get an infinite distance.
+        """
+
+        field = self.distance_field(goal_pos)
+        angles = np.asarray(angles, dtype=float)
+
+        # Points sampled along each ray, so rays can't cross obstacles
+        num_samples = max(int(math.ceil(2 * lookahead / self.resolution)), 1)
+        ts = np.arange(1, num_samples + 1) * (lookahead / num_samples)
+
+        # Positive angles rotate counter-clockwise, towards -Z
+        xs = pos[0] + np.outer(np.cos(angles), ts)
+        zs = pos[2] - np.outer(np.sin(angles), ts)
+        i = ((xs - self.min_x) / self.resolution).astype(int)
+        j = ((zs - self.min_z) / self.resolution).astype(int)
+        i = np.clip(i, 0, self.num_cols - 1)
+        j = np.clip(j, 0, self.num_rows - 1)
+
+        # Rays may start in occupied cells, close to a wall,
+        # but they must end up and stay in free space
+        free = self.free[j, i]
+        after_free = np.cumsum(free, axis=1) > 0
+        valid = np.all(free | ~after_free, axis=1) & free[:, -1]
+
+        return np.where(valid, field[j[:, -1], i[:, -1]], np.inf)
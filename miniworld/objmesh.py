@@ -2,8 +2,15 @@ import os
 
 import numpy as np
 import pyglet
+
+# pyglet options are set by miniworld.opengl, before pyglet.gl is imported
+# isort: off
+import miniworld.opengl  # noqa: F401
 from pyglet.gl import GL_TEXTURE_2D, GL_TRIANGLES, glBindTexture, glDisable, glEnable
 
+# isort: on
+
+from miniworld.assets import mesh_data
 from miniworld.opengl import Texture
 from miniworld.utils import get_file_path
 
@@ -25,17 +32,30 @@ class ObjMesh:
         # Assemble the absolute path to the mesh file
         file_path = get_file_path("meshes", mesh_name, "obj")
 
-        if file_path in self.cache:
-            return self.cache[file_path]
+        return self.from_file(file_path)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Load a mesh file or use a cached version
+        """
+
+        if file_path in cls.cache:
+            return cls.cache[file_path]
 
         mesh = ObjMesh(file_path)
-        self.cache[file_path] = mesh
+        cls.cache[file_path] = mesh
 
         return mesh
 
-    def __init__(self, file_path):
+    def __reduce__(self):
+        # Meshes are pickled by path, and unpickled through the cache
+        return (ObjMesh.from_file, (self.file_path,))
+
+    def __init__(self, file_path, use_archive=True):
         """
-        Load an OBJ model file
+        Load an OBJ model file, or its pre-parsed version from the asset
+        archive unless use_archive is False
 
         Limitations:
         - only one object/group
@@ -54,6 +74,17 @@ class ObjMesh:
 
         # print('Loading mesh "%s"' % file_path)
 
+        self.file_path = file_path
+
+        # Vertex lists and textures, one per chunk
+        self.vlists = None
+        self.textures = None
+
+        packed = mesh_data(file_path) if use_archive else None
+        if packed is not None:
+            self.min_coords, self.max_coords, self.chunk_data = packed
+            return
+
         # Attempt to load the materials library
         materials = self._load_mtl(file_path)
         mesh_file = open(file_path)
@@ -185,30 +216,48 @@ class ObjMesh:
         self.min_coords = list_verts.min(axis=0).min(axis=0)
         self.max_coords = list_verts.max(axis=0).max(axis=0)
 
-        # Vertex lists, one per chunk
-        self.vlists = []
-
-        # Textures, one per chunk
-        self.textures = []
-
-        # For each chunk
+        # Vertex data and texture path of each chunk
+        # These are only uploaded on the first render, so that meshes can
+        # be loaded without an OpenGL context
+        self.chunk_data = []
         for chunk in chunks:
             start_idx = chunk["start_idx"]
             end_idx = chunk["end_idx"]
-            num_faces_chunk = end_idx - start_idx
+            self.chunk_data.append(
+                (
+                    list_verts[start_idx:end_idx, :, :].reshape(-1),
+                    list_texcs[start_idx:end_idx, :, :].reshape(-1),
+                    list_norms[start_idx:end_idx, :, :].reshape(-1),
+                    list_color[start_idx:end_idx, :, :].reshape(-1),
+                    chunk["mtl"].get("map_Kd"),
+                )
+            )
+
+    def upload(self):
+        """
+        Create the vertex lists and textures of the mesh,
+        if they were not created already
+        """
 
+        if self.vlists is not None:
+            return
+
+        self.vlists = []
+        self.textures = []
+
+        # For each chunk
+        for verts, texcs, norms, color, tex_path in self.chunk_data:
             # Create a vertex list to be used for rendering
             vlist = pyglet.graphics.vertex_list(
-                3 * num_faces_chunk,
-                ("v3f", list_verts[start_idx:end_idx, :, :].reshape(-1)),
-                ("t2f", list_texcs[start_idx:end_idx, :, :].reshape(-1)),
-                ("n3f", list_norms[start_idx:end_idx, :, :].reshape(-1)),
-                ("c3f", list_color[start_idx:end_idx, :, :].reshape(-1)),
+                len(verts) // 3,
+                ("v3f", verts),
+                ("t2f", texcs),
+                ("n3f", norms),
+                ("c3f", color),
             )
 
-            mtl = chunk["mtl"]
-            if "map_Kd" in mtl:
-                texture = Texture.load(mtl["map_Kd"])
+            if tex_path is not None:
+                texture = Texture.load(tex_path)
             else:
                 texture = None
 
@@ -278,6 +327,8 @@ class ObjMesh:
         return materials
 
     def render(self):
+        self.upload()
+
         for idx, vlist in enumerate(self.vlists):
             texture = self.textures[idx]
 
@@ -4,11 +4,18 @@ from ctypes import POINTER, byref
 import numpy as np
 import pyglet
 
+# Don't create pyglet's hidden shadow window when pyglet.gl is imported.
+# Environments create their own hidden window once they render, so that
+# state observations work without a display. Other modules using pyglet.gl
+# import this module first, so that the option is set before.
+pyglet.options["shadow_window"] = False
+
 # Solution to https://github.com/maximecb/gym-miniworld/issues/24
 # until pyglet support egl officially
-from pyglet.gl import (
+from pyglet.gl import (  # noqa: E402
     GL_COLOR_ATTACHMENT0,
     GL_COLOR_BUFFER_BIT,
+    GL_CULL_FACE,
     GL_DEPTH_ATTACHMENT,
     GL_DEPTH_BUFFER_BIT,
     GL_DEPTH_COMPONENT,
@@ -58,12 +65,19 @@ from pyglet.gl import (
     glBlitFramebuffer,
     glCheckFramebufferStatus,
     glColor3f,
+    glDeleteFramebuffers,
+    glDeleteLists,
+    glDeleteQueries,
+    glDeleteRenderbuffers,
+    glDeleteTextures,
     glEnable,
     glEnd,
     glFramebufferRenderbuffer,
     glFramebufferTexture2D,
     glGenerateMipmap,
     glGenFramebuffers,
+    glGenLists,
+    glGenQueries,
     glGenRenderbuffers,
     glGenTextures,
     glGetIntegerv,
@@ -80,7 +94,8 @@ from pyglet.gl import (
     glViewport,
 )
 
-from miniworld.utils import get_file_path
+from miniworld.assets import texture_pixels  # noqa: E402
+from miniworld.utils import get_file_path  # noqa: E402
 
 if os.environ.get("PYOPENGL_PLATFORM", None) == "egl":
     pyglet.options["headless"] = True
@@ -117,7 +132,35 @@ class Texture:
         Also performs domain randomization if multiple versions are available.
         """
 
-        paths = self.tex_paths.get(tex_name, [])
+        paths = self.get_paths(tex_name)
+
+        # If domain-randomization is to be used
+        if rng:
+            path_idx = rng.integers(0, len(paths))
+            path = paths[path_idx]
+        else:
+            path = paths[0]
+
+        return self.from_path(path, tex_name)
+
+    @classmethod
+    def from_path(cls, tex_path, tex_name):
+        """
+        Get the texture stored in a given file (or use a cached version)
+        """
+
+        if tex_path not in cls.tex_cache:
+            cls.tex_cache[tex_path] = Texture(tex_path, tex_name)
+
+        return cls.tex_cache[tex_path]
+
+    @classmethod
+    def get_paths(cls, tex_name):
+        """
+        List the files of all the versions of a texture
+        """
+
+        paths = cls.tex_paths.get(tex_name, [])
 
         # Get an inventory of the existing texture files
         if len(paths) == 0:
@@ -127,22 +170,23 @@ class Texture:
                 if not os.path.exists(path):
                     break
                 paths.append(path)
+            cls.tex_paths[tex_name] = paths
 
         assert len(paths) > 0, ValueError(
             'failed to load textures for name "%s"' % tex_name
         )
 
-        # If domain-randomization is to be used
-        if rng:
-            path_idx = rng.integers(0, len(paths))
-            path = paths[path_idx]
-        else:
-            path = paths[0]
+        return paths
 
-        if path not in self.tex_cache:
-            self.tex_cache[path] = Texture(Texture.load(path), tex_name)
+    @classmethod
+    def preload(cls, tex_name):
+        """
+        Load and upload all the versions of a texture, so that domain
+        randomization never has to read texture files during an episode
+        """
 
-        return self.tex_cache[path]
+        for path in cls.get_paths(tex_name):
+            cls.from_path(path, tex_name).upload()
 
     @classmethod
     def load(cls, tex_path):
@@ -153,8 +197,35 @@ class Texture:
 
         # print('Loading texture "%s"' % tex_path)
 
-        img = pyglet.image.load(tex_path)
-        tex = img.get_texture()
+        pixels = texture_pixels(tex_path)
+        if pixels is not None:
+            return cls.load_pixels(pixels)
+
+        return cls.load_image(pyglet.image.load(tex_path))
+
+    @classmethod
+    def load_image(cls, img):
+        """
+        Upload a decoded image into a new OpenGL texture
+        """
+
+        data = img.get_image_data().get_data("RGBA", img.width * 4)
+        return cls._upload(img.get_texture(), img.width, img.height, data)
+
+    @classmethod
+    def load_pixels(cls, pixels):
+        """
+        Upload an array of RGBA pixels, bottom row first,
+        into a new OpenGL texture
+        """
+
+        height, width = pixels.shape[:2]
+        tex = pyglet.image.Texture.create(width, height)
+        data = pixels.ctypes.data_as(POINTER(GLubyte))
+        return cls._upload(tex, width, height, data)
+
+    @classmethod
+    def _upload(cls, tex, width, height, data):
         glEnable(tex.target)
         glBindTexture(tex.target, tex.id)
 
@@ -162,12 +233,12 @@ class Texture:
             GL_TEXTURE_2D,
             0,
             GL_RGB,
-            img.width,
-            img.height,
+            width,
+            height,
             0,
             GL_RGBA,
             GL_UNSIGNED_BYTE,
-            img.get_image_data().get_data("RGBA", img.width * 4),
+            data,
         )
 
         # Generate mipmaps (multiple levels of detail)
@@ -183,14 +254,42 @@ class Texture:
 
         return tex
 
-    def __init__(self, tex, tex_name):
-        assert not isinstance(tex, str)
-        self.tex = tex
-        self.width = self.tex.width
-        self.height = self.tex.height
+    def __init__(self, tex_path, tex_name):
+        # The image is decoded right away, but it is only uploaded the
+        # first time the texture is bound, so that textures can be
+        # created without an OpenGL context
+        # Textures in the asset archive are already decoded
+        self.path = tex_path
+        self.pixels = texture_pixels(tex_path)
+        if self.pixels is not None:
+            self.img = None
+            self.height, self.width = self.pixels.shape[:2]
+        else:
+            self.img = pyglet.image.load(tex_path)
+            self.width = self.img.width
+            self.height = self.img.height
         self.name = tex_name
+        self.tex = None
+
+    def __reduce__(self):
+        # Textures are pickled by path, and unpickled through the cache
+        return (Texture.from_path, (self.path, self.name))
+
+    def upload(self):
+        """
+        Upload the texture, if it was not uploaded already
+        """
+
+        if self.tex is None:
+            if self.pixels is not None:
+                self.tex = Texture.load_pixels(self.pixels)
+            else:
+                self.tex = Texture.load_image(self.img)
+            self.img = None
+            self.pixels = None
 
     def bind(self):
+        self.upload()
         glBindTexture(self.tex.target, self.tex.id)
 
 
@@ -208,6 +307,18 @@ class FrameBuffer:
         self.width = width
         self.height = height
 
+        # Number of samples of the multisampled buffers,
+        # 0 if multisampling isn't supported
+        self.num_samples = 0
+
+        # Key of the observation last rendered into the frame buffer,
+        # reset whenever the frame buffer is bound
+        self.key = None
+
+        # Textures and render buffers attached to the frame buffers
+        self.textures = []
+        self.render_buffers = []
+
         # Create a frame buffer (rendering target)
         self.multi_fbo = GLuint(0)
         glGenFramebuffers(1, byref(self.multi_fbo))
@@ -233,6 +344,7 @@ class FrameBuffer:
             # Create a multisampled texture to render into
             fbTex = GLuint(0)
             glGenTextures(1, byref(fbTex))
+            self.textures.append(fbTex)
             glBindTexture(GL_TEXTURE_2D_MULTISAMPLE, fbTex)
             glTexImage2DMultisample(
                 GL_TEXTURE_2D_MULTISAMPLE, num_samples, GL_RGBA32F, width, height, True
@@ -248,6 +360,7 @@ class FrameBuffer:
             # Attach a multisampled depth buffer to the FBO
             depth_rb = GLuint(0)
             glGenRenderbuffers(1, byref(depth_rb))
+            self.render_buffers.append(depth_rb)
             glBindRenderbuffer(GL_RENDERBUFFER, depth_rb)
             glRenderbufferStorageMultisample(
                 GL_RENDERBUFFER, num_samples, GL_DEPTH_COMPONENT16, width, height
@@ -260,12 +373,15 @@ class FrameBuffer:
             res = glCheckFramebufferStatus(GL_FRAMEBUFFER)
             assert res == GL_FRAMEBUFFER_COMPLETE, FB_ERROR_ENUMS.get(res, res)
 
+            self.num_samples = num_samples
+
         except Exception:
             print("Falling back to non-multisampled frame buffer")
 
             # Create a plain texture to render into
             fbTex = GLuint(0)
             glGenTextures(1, byref(fbTex))
+            self.textures.append(fbTex)
             glBindTexture(GL_TEXTURE_2D, fbTex)
             glTexImage2D(
                 GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_FLOAT, None
@@ -277,6 +393,7 @@ class FrameBuffer:
             # Attach depth buffer to FBO
             depth_rb = GLuint(0)
             glGenRenderbuffers(1, byref(depth_rb))
+            self.render_buffers.append(depth_rb)
             glBindRenderbuffer(GL_RENDERBUFFER, depth_rb)
             glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT16, width, height)
             glFramebufferRenderbuffer(
@@ -295,6 +412,7 @@ class FrameBuffer:
         # Create the texture used to resolve the final render
         fbTex = GLuint(0)
         glGenTextures(1, byref(fbTex))
+        self.textures.append(fbTex)
         glBindTexture(GL_TEXTURE_2D, fbTex)
         glTexImage2D(
             GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_FLOAT, None
@@ -306,6 +424,7 @@ class FrameBuffer:
         # Create a depth buffer for the final frame buffer
         depth_rb = GLuint(0)
         glGenRenderbuffers(1, byref(depth_rb))
+        self.render_buffers.append(depth_rb)
         glBindRenderbuffer(GL_RENDERBUFFER, depth_rb)
         glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT16, width, height)
         glFramebufferRenderbuffer(
@@ -331,14 +450,18 @@ class FrameBuffer:
         Bind the frame buffer before rendering into it
         """
 
+        # Whatever is rendered next replaces the last observation
+        self.key = None
+
         # Bind the multisampled frame buffer
         glEnable(GL_MULTISAMPLE)
         glBindFramebuffer(GL_FRAMEBUFFER, self.multi_fbo)
         glViewport(0, 0, self.width, self.height)
 
-    def resolve(self):
+    def resolve(self, out=None):
         """
         Produce a numpy image array from the rendered image
+        If an output array is given, the image is written into it
         """
 
         # Resolve the multisampled frame buffer into the final frame buffer
@@ -391,6 +514,10 @@ class FrameBuffer:
         # Flip the image because OpenGL maps (0,0) to the lower-left corner
         # Note: this is necessary for gym.wrappers.Monitor to record videos
         # properly, otherwise they are vertically inverted.
+        if out is not None:
+            np.copyto(out, np.flip(self.img_array, axis=0))
+            return out
+
         # Note: ascontiguousarray operates in constant time because it
         # does not copy the data
         img = np.ascontiguousarray(np.flip(self.img_array, axis=0))
@@ -434,6 +561,179 @@ class FrameBuffer:
 
         return depth_map
 
+    def delete(self):
+        """
+        Delete the OpenGL objects of the frame buffer
+        """
+
+        glDeleteFramebuffers(1, byref(self.multi_fbo))
+        glDeleteFramebuffers(1, byref(self.final_fbo))
+        for tex in self.textures:
+            glDeleteTextures(1, byref(tex))
+        for render_buffer in self.render_buffers:
+            glDeleteRenderbuffers(1, byref(render_buffer))
+        self.textures = []
+        self.render_buffers = []
+
+
+class GLContext:
+    """
+    OpenGL context shared by all the environments of a process.
+
+    Textures, meshes and display lists are shared between the contexts
+    of a process, so a single context can render any number of
+    environments. Frame buffers are shared as well, by size and number
+    of samples, since observations are read back as soon as they are
+    rendered. Contexts and frame buffers are reference counted, and
+    destroyed once no environment uses them any more.
+    """
+
+    # Context used by the environments of the process, if any
+    current = None
+
+    # Hidden window created with the first context and kept open for the
+    # lifetime of the process. The contexts of the windows rendered into
+    # share its objects, so cached textures and meshes outlive them.
+    root_window = None
+
+    @classmethod
+    def acquire(cls):
+        """
+        Get a reference to the shared context, creating it if needed
+        """
+
+        if cls.current is None:
+            cls.current = cls()
+        cls.current.ref_count += 1
+        return cls.current
+
+    def __init__(self):
+        # pyglet shares the objects of new contexts with the current one
+        if GLContext.root_window is None:
+            GLContext.root_window = pyglet.window.Window(
+                width=1, height=1, visible=False
+            )
+        GLContext.root_window.switch_to()
+
+        # Invisible window to render into
+        self.window = pyglet.window.Window(width=1, height=1, visible=False)
+
+        # Enable depth testing and backface culling
+        glEnable(GL_DEPTH_TEST)
+        glEnable(GL_CULL_FACE)
+
+        self.ref_count = 0
+
+        # Shared frame buffers and their reference counts,
+        # indexed by (width, height, num_samples)
+        self.frame_buffers = {}
+
+    def switch_to(self):
+        self.window.switch_to()
+
+    def acquire_frame_buffer(self, width, height, num_samples):
+        """
+        Get a reference to a frame buffer of the given size
+        """
+
+        key = (width, height, num_samples)
+        if key not in self.frame_buffers:
+            self.switch_to()
+            self.frame_buffers[key] = [FrameBuffer(width, height, num_samples), 0]
+        self.frame_buffers[key][1] += 1
+        return self.frame_buffers[key][0]
+
+    def release_frame_buffer(self, frame_buffer):
+        for key, entry in self.frame_buffers.items():
+            if entry[0] is frame_buffer:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self.switch_to()
+                    frame_buffer.delete()
+                    del self.frame_buffers[key]
+                return
+
+    def release(self):
+        """
+        Release a reference to the context, destroying it with the last one
+        """
+
+        self.ref_count -= 1
+        if self.ref_count > 0:
+            return
+
+        self.switch_to()
+        for frame_buffer, _ in self.frame_buffers.values():
+            frame_buffer.delete()
+        self.frame_buffers = {}
+        self.window.close()
+
+        if GLContext.current is self:
+            GLContext.current = None
+
+
+class GLResources:
+    """
+    OpenGL objects used by one environment in the shared context:
+    frame buffers, display lists and occlusion queries. They are all
+    freed at once when the environment is closed.
+    """
+
+    def __init__(self):
+        self.context = GLContext.acquire()
+        self.frame_buffers = []
+        self.lists = []
+
+        # Occlusion query ids, reused across calls
+        self.query_ids = (GLuint * 0)()
+
+    def switch_to(self):
+        self.context.switch_to()
+
+    def frame_buffer(self, width, height, num_samples=1):
+        frame_buffer = self.context.acquire_frame_buffer(width, height, num_samples)
+        self.frame_buffers.append(frame_buffer)
+        return frame_buffer
+
+    def gen_list(self):
+        """
+        Allocate a display list id
+        """
+
+        list_id = glGenLists(1)
+        self.lists.append(list_id)
+        return list_id
+
+    def queries(self, count):
+        """
+        Get at least the given number of occlusion query ids
+        """
+
+        if len(self.query_ids) < count:
+            if len(self.query_ids) > 0:
+                glDeleteQueries(len(self.query_ids), self.query_ids)
+            self.query_ids = (GLuint * count)()
+            glGenQueries(count, self.query_ids)
+        return self.query_ids
+
+    def release(self):
+        """
+        Free the objects of the environment and release the context
+        """
+
+        self.switch_to()
+        for list_id in self.lists:
+            glDeleteLists(list_id, 1)
+        if len(self.query_ids) > 0:
+            glDeleteQueries(len(self.query_ids), self.query_ids)
+        for frame_buffer in self.frame_buffers:
+            self.context.release_frame_buffer(frame_buffer)
+        self.lists = []
+        self.query_ids = (GLuint * 0)()
+        self.frame_buffers = []
+
+        self.context.release()
+
 
 def drawAxes(len=0.1):
     """
@@ -1,5 +1,4 @@
 from collections import namedtuple
-from copy import deepcopy
 
 import numpy as np
 
@@ -7,6 +6,10 @@ import numpy as np
 class DomainParams:
     """
     Set of simulation parameters
+
+    Parameters are compiled into a structured array holding their default,
+    min and max values, from which many values of many parameters can be
+    drawn at once with sample_table.
     """
 
     # Simulation parameter, with domain randomization range
@@ -18,8 +21,19 @@ class DomainParams:
         # Dictionary of parameters, indexed by name
         self.params = {}
 
+        # Compiled table of default, min and max values
+        self.table = None
+
     def copy(self):
-        return deepcopy(self)
+        """
+        Make a copy, which can be modified independently
+        Parameters are immutable tuples, and are shared with the copy.
+        """
+
+        copy = type(self)()
+        copy.params = dict(self.params)
+        copy.table = self.table
+        return copy
 
     def no_random(self):
         """
@@ -28,15 +42,34 @@ class DomainParams:
         limited subset of the parameters.
         """
 
-        copy = self.copy()
-
-        for name, p in copy.params.items():
+        copy = type(self)()
+        for name, p in self.params.items():
             copy.params[name] = DomainParams.DomainParam(
                 p.default, p.default, p.default, p.type
             )
 
         return copy
 
+    def compile(self):
+        """
+        Get the structured array of the parameters, with one field per
+        parameter and the default, min and max values as rows
+        """
+
+        if self.table is None:
+            dtype = np.dtype(
+                [
+                    (name, "i8" if p.type == "int" else "f8", np.shape(p.default))
+                    for name, p in self.params.items()
+                ]
+            )
+            table = np.zeros(3, dtype=dtype)
+            for name, p in self.params.items():
+                table[name] = [p.default, p.min, p.max]
+            self.table = table
+
+        return self.table
+
     def set(self, name, default, min=None, max=None, type="float"):
         """
         Register/modify a named parameter
@@ -76,6 +109,7 @@ class DomainParams:
                 assert default.shape == p.default.shape
 
         self.params[name] = DomainParams.DomainParam(default, min, max, type)
+        self.table = None
 
     def get_max(self, name):
         assert name in self.params, name
@@ -102,13 +136,54 @@ class DomainParams:
 
         assert False
 
+    def sample_table(self, rng, n, param_names=None):
+        """
+        Sample n values of a list of parameters (all by default) at once,
+        e.g. for n environments or n time steps
+        Returns a structured array of shape (n,) with one field per parameter
+        Note: when rng is None, the default values are returned
+        """
+
+        table = self.compile()
+        if param_names is None:
+            param_names = list(table.dtype.names)
+        dtype = np.dtype([(name, table.dtype[name]) for name in param_names])
+
+        values = np.empty(n, dtype=dtype)
+        if rng is None:
+            for name in param_names:
+                values[name] = table[name][0]
+            return values
+
+        # All the float values are drawn in a single call
+        float_names = [name for name in param_names if dtype[name].base.kind == "f"]
+        sizes = [int(np.prod(dtype[name].shape)) for name in float_names]
+        uniform = rng.random((n, sum(sizes)))
+
+        offset = 0
+        for name, size in zip(float_names, sizes):
+            low, high = table[name][1], table[name][2]
+            u = uniform[:, offset : offset + size].reshape((n,) + dtype[name].shape)
+            values[name] = low + u * (high - low)
+            offset += size
+
+        for name in param_names:
+            if dtype[name].base.kind == "i":
+                low, high = table[name][1], table[name][2]
+                values[name] = rng.integers(low, high + 1, (n,) + dtype[name].shape)
+
+        return values
+
     def sample_many(self, rng, target_obj, param_names):
         """
         Sample a list of parameters
         """
 
+        values = self.sample_table(rng, 1, param_names)[0]
         for name in param_names:
-            setattr(target_obj, name, self.sample(rng, name))
+            value = values[name]
+            value = value.item() if value.ndim == 0 else value.copy()
+            setattr(target_obj, name, value)
 
 
 # Default simulation parameters
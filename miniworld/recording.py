@@ -0,0 +1,291 @@
+import json
+import struct
+
+import gymnasium as gym
+import numpy as np
+
+from miniworld.opengl import GLResources
+
+# Magic number and version at the start of every episode log
+MAGIC = b"MWREC"
+VERSION = 1
+
+# Record tags
+# Each record is a tag byte followed by its payload
+TAG_RESET = b"R"
+TAG_ACTIONS = b"A"
+TAG_GAIN = b"G"
+
+# Actions are discrete and stored as single bytes
+ACTION_DTYPE = np.uint8
+
+
+def _write_json(file, tag, obj):
+    """
+    Write a record whose payload is a JSON document
+    """
+
+    data = json.dumps(obj).encode("utf-8")
+    file.write(tag + struct.pack("<I", len(data)) + data)
+
+
+def _read_json(file):
+    (size,) = struct.unpack("<I", file.read(4))
+    return json.loads(file.read(size).decode("utf-8"))
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """
+    Record the episodes of an environment to a compact binary log.
+
+    The log holds the seed and options of each reset, the action sequence
+    and the gain changes, which is enough to reconstruct every episode
+    deterministically with an EpisodeReplayer. Observations are not stored,
+    so a log takes about one byte per step.
+
+    Gain changes are intercepted whether change_gain is called on the
+    recorder or on the underlying environment.
+    """
+
+    def __init__(self, env, path, env_id=None, env_kwargs=None):
+        """
+        path       -- file the log is written to
+        env_id     -- id used to recreate the environment on replay,
+                      defaults to the id of its spec
+        env_kwargs -- arguments used to recreate the environment on replay,
+                      defaults to the kwargs of its spec
+        """
+
+        super().__init__(env)
+
+        spec = env.spec
+        if env_id is None:
+            assert spec is not None, "env_id is required for envs without a spec"
+            env_id = spec.id
+        if env_kwargs is None:
+            env_kwargs = dict(spec.kwargs) if spec is not None else {}
+
+        self.file = open(path, "wb")
+        header = json.dumps({"env_id": env_id, "env_kwargs": env_kwargs})
+        header = header.encode("utf-8")
+        self.file.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header)
+
+        # Actions of the current episode, written when it ends
+        self.actions = []
+
+        # Intercept gain changes made directly on the environment
+        self._change_gain = self.unwrapped.change_gain
+        self.unwrapped.change_gain = self.change_gain
+
+    def _flush_actions(self):
+        if self.actions:
+            actions = np.array(self.actions, dtype=ACTION_DTYPE)
+            self.file.write(TAG_ACTIONS + struct.pack("<I", len(actions)))
+            self.file.write(actions.tobytes())
+            self.actions = []
+
+    def reset(self, *, seed=None, options=None):
+        self._flush_actions()
+
+        # The gain carries over resets, so it is recorded with each one
+        _write_json(
+            self.file,
+            TAG_RESET,
+            {"seed": seed, "options": options, "gain": float(self.unwrapped.gain)},
+        )
+
+        return self.env.reset(seed=seed, options=options)
+
+    def step(self, action):
+        assert 0 <= action <= np.iinfo(ACTION_DTYPE).max
+        self.actions.append(action)
+        return self.env.step(action)
+
+    def change_gain(self, *args, **kwargs):
+        """
+        Change the gain of the environment, recording the call and its result
+        """
+
+        self._flush_actions()
+        self._change_gain(*args, **kwargs)
+        _write_json(
+            self.file,
+            TAG_GAIN,
+            {"args": args, "kwargs": kwargs, "gain": float(self.unwrapped.gain)},
+        )
+
+    def close(self):
+        if not self.file.closed:
+            self._flush_actions()
+            self.file.close()
+            del self.unwrapped.change_gain
+        super().close()
+
+
+class EpisodeReplayer:
+    """
+    Reconstruct the episodes recorded by an EpisodeRecorder.
+
+    Episodes are simulated without rendering, and only the requested
+    frames are rendered, at any resolution:
+
+        replayer = EpisodeReplayer("episodes.bin")
+        frames = replayer.replay(3, frames=[0, 10, 20], width=640, height=480)
+    """
+
+    def __init__(self, path):
+        self.episodes = []
+
+        with open(path, "rb") as file:
+            magic = file.read(len(MAGIC))
+            assert magic == MAGIC, "not an episode log"
+            version, size = struct.unpack("<II", file.read(8))
+            assert version == VERSION, "unsupported log version %d" % version
+            header = json.loads(file.read(size).decode("utf-8"))
+            self.env_id = header["env_id"]
+            self.env_kwargs = header["env_kwargs"]
+
+            # Events of an episode are kept in order as (kind, value) tuples,
+            # kind being either "actions" or "gain"
+            events = None
+            while True:
+                tag = file.read(1)
+                if not tag:
+                    break
+                if tag == TAG_RESET:
+                    reset = _read_json(file)
+                    events = []
+                    self.episodes.append((reset, events))
+                elif tag == TAG_ACTIONS:
+                    (count,) = struct.unpack("<I", file.read(4))
+                    actions = np.frombuffer(file.read(count), dtype=ACTION_DTYPE)
+                    events.append(("actions", actions))
+                elif tag == TAG_GAIN:
+                    gain = _read_json(file)
+                    if events is None:
+                        # Gain changed before the first reset
+                        events = []
+                        self.episodes.append((None, events))
+                    events.append(("gain", gain))
+                else:
+                    raise ValueError("invalid record tag %r" % tag)
+
+        self.env = None
+        self.gl = None
+        self.frame_buffers = {}
+
+    def __len__(self):
+        return sum(reset is not None for reset, _ in self.episodes)
+
+    def num_steps(self, episode):
+        """
+        Number of steps of a recorded episode
+        """
+
+        _, events = self.episodes[self._index(episode)]
+        return sum(len(value) for kind, value in events if kind == "actions")
+
+    def _index(self, episode):
+        """
+        Position in self.episodes of the n-th episode started by a reset
+        """
+
+        indices = [i for i, (reset, _) in enumerate(self.episodes) if reset]
+        return indices[episode]
+
+    def _make_env(self):
+        # Episodes are simulated without rendering
+        if self.env is None:
+            kwargs = dict(self.env_kwargs, obs_mode="state")
+            self.env = gym.make(self.env_id, **kwargs).unwrapped
+        return self.env
+
+    def _frame_buffer(self, width, height, num_samples):
+        """
+        Get a frame buffer of the given size, creating it on first use
+        """
+
+        key = (width, height, num_samples)
+        if key not in self.frame_buffers:
+            if self.gl is None:
+                self.gl = GLResources()
+            self.gl.switch_to()
+            self.frame_buffers[key] = self.gl.frame_buffer(width, height, num_samples)
+        return self.frame_buffers[key]
+
+    def _apply(self, kind, value):
+        env = self.env
+        if kind == "gain":
+            env.change_gain(*value["args"], **value["kwargs"])
+            # The gain may have been drawn from an unseeded generator
+            env.gain = value["gain"]
+        else:
+            for action in value:
+                env.step(int(action))
+
+    def replay(self, episode, frames=(), width=None, height=None, num_samples=1):
+        """
+        Reconstruct an episode, rendering the frames observed after
+        the given numbers of steps, 0 being the frame after the reset.
+        Returns the list of rendered frames.
+        """
+
+        env = self._make_env()
+        index = self._index(episode)
+
+        # Episodes reset without a seed continue the random stream of the
+        # previous ones, so replay starts from the last seeded reset
+        start = index
+        while start > 0 and (
+            self.episodes[start][0] is None or self.episodes[start][0]["seed"] is None
+        ):
+            start -= 1
+
+        for reset, events in self.episodes[start:index]:
+            if reset is not None:
+                env.reset(seed=reset["seed"], options=reset["options"])
+                env.gain = reset["gain"]
+            for kind, value in events:
+                self._apply(kind, value)
+
+        reset, events = self.episodes[index]
+        env.reset(seed=reset["seed"], options=reset["options"])
+        env.gain = reset["gain"]
+
+        # Frame buffer the requested frames are rendered into
+        frames = sorted(frames)
+        images = []
+        if frames:
+            frame_buffer = self._frame_buffer(
+                width or env.obs_width, height or env.obs_height, num_samples
+            )
+
+        def render_until(step):
+            while frames and frames[0] <= step:
+                if frames.pop(0) == step:
+                    images.append(env.render_obs(frame_buffer))
+
+        step = 0
+        render_until(step)
+        for kind, value in events:
+            if kind == "gain":
+                self._apply(kind, value)
+                continue
+            for action in value:
+                if not frames:
+                    break
+                env.step(int(action))
+                step += 1
+                render_until(step)
+
+        return images
+
+    def close(self):
+        # The frame buffers are freed before the env releases the context
+        if self.gl is not None:
+            self.gl.release()
+            self.gl = None
+            self.frame_buffers = {}
+        if self.env is not None:
+            self.env.close()
+            self.env = None
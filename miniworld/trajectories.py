@@ -0,0 +1,245 @@
+import json
+import os
+import queue
+import threading
+
+import gymnasium as gym
+import numpy as np
+
+# Name of the index file of a trajectory directory
+INDEX_FILE = "index.json"
+
+
+def _chunk_path(directory, name, chunk):
+    return os.path.join(directory, "%s_%05d.npy" % (name, chunk))
+
+
+class TrajectoryWriter:
+    """
+    Stream trajectories into chunked, memory-mapped .npy files.
+
+    Each field (observations, depth maps, poses, actions, rewards...)
+    is stored in preallocated chunks of a fixed number of frames. Frames
+    are copied into the memory map of the current chunk, and full chunks
+    are flushed to disk by a background thread, so the step loop neither
+    stalls on disk writes nor accumulates data in memory.
+
+    The index file lists the fields, the number of frames written and
+    the first frame of each episode.
+    """
+
+    def __init__(self, directory, chunk_size=4096):
+        """
+        directory  -- directory the chunks and the index are written to
+        chunk_size -- number of frames per chunk
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+        # Fields are declared by the first frame written, as name -> (shape, dtype)
+        self.fields = None
+        self.chunks = None
+        self.num_frames = 0
+        self.episodes = []
+
+        # Full chunks waiting to be flushed
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._flush_worker, daemon=True)
+        self.thread.start()
+
+    def _flush_worker(self):
+        while True:
+            chunks = self.queue.get()
+            if chunks is None:
+                break
+            for chunk in chunks.values():
+                chunk.flush()
+
+    def _open_chunks(self):
+        """
+        Preallocate the chunk files for the next frames
+        """
+
+        chunk = self.num_frames // self.chunk_size
+        self.chunks = {
+            name: np.lib.format.open_memmap(
+                _chunk_path(self.directory, name, chunk),
+                mode="w+",
+                dtype=dtype,
+                shape=(self.chunk_size,) + shape,
+            )
+            for name, (shape, dtype) in self.fields.items()
+        }
+
+    def start_episode(self):
+        """
+        Mark the next frame as the first frame of a new episode
+        """
+
+        self.episodes.append(self.num_frames)
+
+    def write(self, **frame):
+        """
+        Write one frame, given as one value per field
+        """
+
+        if self.fields is None:
+            self.fields = {}
+            for name, value in frame.items():
+                value = np.asarray(value)
+                self.fields[name] = (value.shape, value.dtype.str)
+
+        assert frame.keys() == self.fields.keys(), "fields can't change"
+
+        if self.chunks is None:
+            self._open_chunks()
+
+        idx = self.num_frames % self.chunk_size
+        for name, value in frame.items():
+            self.chunks[name][idx] = value
+        self.num_frames += 1
+
+        # Hand the full chunk over to the flush thread
+        if idx == self.chunk_size - 1:
+            self.queue.put(self.chunks)
+            self.chunks = None
+            self._write_index()
+
+    def _write_index(self):
+        index = {
+            "chunk_size": self.chunk_size,
+            "num_frames": self.num_frames,
+            "episodes": self.episodes,
+            "fields": {
+                name: {"shape": list(shape), "dtype": dtype}
+                for name, (shape, dtype) in (self.fields or {}).items()
+            },
+        }
+
+        # Replace the index atomically, so readers never see a partial file
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(index, file)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        if self.thread is None:
+            return
+
+        if self.chunks is not None:
+            self.queue.put(self.chunks)
+            self.chunks = None
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        self._write_index()
+
+
+class TrajectoryReader:
+    """
+    Read the trajectories written by a TrajectoryWriter,
+    with the chunks memory-mapped rather than loaded in memory
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as file:
+            index = json.load(file)
+
+        self.chunk_size = index["chunk_size"]
+        self.num_frames = index["num_frames"]
+        self.episodes = index["episodes"]
+
+        num_chunks = -(-self.num_frames // self.chunk_size)
+        self.chunks = {
+            name: [
+                np.load(_chunk_path(directory, name, chunk), mmap_mode="r")
+                for chunk in range(num_chunks)
+            ]
+            for name in index["fields"]
+        }
+
+    def __len__(self):
+        return self.num_frames
+
+    def get(self, name, start, stop):
+        """
+        Get the values of a field over a range of frames
+        """
+
+        stop = min(stop, self.num_frames)
+        parts = []
+        while start < stop:
+            chunk, idx = divmod(start, self.chunk_size)
+            count = min(stop - start, self.chunk_size - idx)
+            parts.append(self.chunks[name][chunk][idx : idx + count])
+            start += count
+
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def episode(self, index, name):
+        """
+        Get the values of a field over an episode
+        """
+
+        start = self.episodes[index]
+        if index + 1 < len(self.episodes):
+            stop = self.episodes[index + 1]
+        else:
+            stop = self.num_frames
+        return self.get(name, start, stop)
+
+
+class TrajectoryWrapper(gym.Wrapper):
+    """
+    Stream the observations, poses, actions and rewards of an environment
+    into a TrajectoryWriter, optionally with depth maps.
+
+    One frame is written per reset and per step. The frame written on
+    reset has a zero action and reward.
+    """
+
+    def __init__(self, env, writer, depth=False):
+        super().__init__(env)
+        self.writer = writer
+        self.depth = depth
+
+    def _write(self, obs, action, reward):
+        world = self.unwrapped
+        frame = {
+            "obs": obs,
+            "pos": world.agent.pos.astype(np.float32),
+            "dir": np.float32(world.agent.dir),
+            "action": np.uint8(action),
+            "reward": np.float32(reward),
+        }
+
+        # The depth buffer still holds the observation just rendered,
+        # unless the observation came from the observation cache or
+        # nothing was rendered for state observations
+        if self.depth:
+            if world.obs_cache is not None or world.obs_mode == "state":
+                frame["depth"] = world.render_depth()
+            else:
+                world._make_current()
+                frame["depth"] = world.obs_fb.get_depth_map(0.04, 100.0)
+
+        self.writer.write(**frame)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.writer.start_episode()
+        self._write(obs, 0, 0)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, termination, truncation, info = self.env.step(action)
+        self._write(obs, action, reward)
+        return obs, reward, termination, truncation, info
+
+    def close(self):
+        self.writer.close()
+        super().close()
@@ -0,0 +1,709 @@
+import multiprocessing as mp
+import sys
+import traceback
+from copy import deepcopy
+from multiprocessing.connection import wait
+
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector.utils import (
+    create_shared_memory,
+    iterate,
+    read_from_shared_memory,
+)
+
+from miniworld.math import intersect_circles_segs
+from miniworld.miniworld import MiniWorldEnv
+from miniworld.objmesh import ObjMesh
+from miniworld.opengl import Texture
+
+
+class MiniWorldVectorEnv(gym.vector.VectorEnv):
+    """
+    Vectorized environment holding several MiniWorld worlds in one process.
+
+    All the worlds render through the OpenGL context and frame buffers
+    shared by the environments of the process, and observations are
+    written into a preallocated (N, H, W, 3) array. Sub-environments which
+    terminate or are truncated are automatically reset, following the
+    Gymnasium vector API.
+
+    The moves of the agents, and their collisions with the walls and
+    entities of their worlds, are computed in a single batch before
+    the worlds step. Each world's step, task logic included, then
+    applies the move planned for it.
+    """
+
+    def __init__(self, env_fns, copy=True):
+        """
+        env_fns -- functions creating the sub-environments
+        copy    -- if False, observations returned by reset and step are
+                   views of the internal buffer, overwritten on each step
+        """
+
+        self.env_fns = env_fns
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.copy = copy
+
+        base = self.envs[0].unwrapped
+        assert isinstance(
+            base.observation_space, spaces.Box
+        ), "only image observations can be vectorized"
+        super().__init__(
+            num_envs=len(self.envs),
+            observation_space=base.observation_space,
+            action_space=base.action_space,
+        )
+
+        for env in self.envs[1:]:
+            assert (
+                env.unwrapped.observation_space == base.observation_space
+            ), "all sub-environments must have the same observation space"
+
+        # Preallocated output buffers
+        self.observations = np.zeros(
+            self.observation_space.shape, dtype=self.observation_space.dtype
+        )
+        self._rewards = np.zeros((self.num_envs,), dtype=np.float64)
+        self._terminateds = np.zeros((self.num_envs,), dtype=np.bool_)
+        self._truncateds = np.zeros((self.num_envs,), dtype=np.bool_)
+        self._actions = None
+
+        # Wall segments of the worlds moving, concatenated, with the index
+        # of the world of each segment
+        self._walls = None
+        self._wall_segs = None
+        self._wall_owners = None
+
+    def reset_wait(self, seed=None, options=None):
+        """
+        Reset all the sub-environments
+        """
+
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        self._terminateds[:] = False
+        self._truncateds[:] = False
+
+        infos = {}
+        for i, (env, single_seed) in enumerate(zip(self.envs, seed)):
+            kwargs = {}
+            if single_seed is not None:
+                kwargs["seed"] = single_seed
+            if options is not None:
+                kwargs["options"] = options
+
+            obs, info = env.reset(**kwargs)
+            self.observations[i] = obs
+            infos = self._add_info(infos, info, i)
+
+        obs = deepcopy(self.observations) if self.copy else self.observations
+        return obs, infos
+
+    def step_async(self, actions):
+        self._actions = list(iterate(self.action_space, actions))
+
+    def step_wait(self):
+        """
+        Step all the sub-environments with the actions from step_async
+        """
+
+        self._plan_moves()
+
+        infos = {}
+        for i, (env, action) in enumerate(zip(self.envs, self._actions)):
+            (
+                obs,
+                self._rewards[i],
+                self._terminateds[i],
+                self._truncateds[i],
+                info,
+            ) = env.step(action)
+            env.unwrapped.planned_move = None
+
+            # Automatically reset finished episodes, keeping the last
+            # observation and info of the episode in the info dict
+            if self._terminateds[i] or self._truncateds[i]:
+                old_obs, old_info = obs, info
+                obs, info = env.reset()
+                info["final_observation"] = old_obs
+                info["final_info"] = old_info
+
+            self.observations[i] = obs
+            infos = self._add_info(infos, info, i)
+
+        obs = deepcopy(self.observations) if self.copy else self.observations
+        return (
+            obs,
+            np.copy(self._rewards),
+            np.copy(self._terminateds),
+            np.copy(self._truncateds),
+            infos,
+        )
+
+    def _plan_moves(self):
+        """
+        Compute the moves of the next step of the worlds moving forward
+        or back, along with their collisions, in a single batch
+        """
+
+        worlds = []
+        moves = []
+        for env, action in zip(self.envs, self._actions):
+            world = env.unwrapped
+            if not _can_plan_move(world):
+                continue
+            move = world.next_move(action)
+            if move is not None:
+                worlds.append(world)
+                moves.append(move)
+
+        if not worlds:
+            return
+
+        fwd_dists, fwd_drifts = np.array(moves).T
+        pos = np.array([world.agent.pos for world in worlds])
+        dir_vecs = np.array([world.agent.dir_vec for world in worlds])
+        right_vecs = np.array([world.agent.right_vec for world in worlds])
+        radii = np.array([world.agent.radius for world in worlds])
+
+        next_pos = (
+            pos + dir_vecs * fwd_dists[:, None] + right_vecs * fwd_drifts[:, None]
+        )
+
+        blocked = np.zeros(len(worlds), dtype=bool)
+
+        segs, owners = self._gather_walls(worlds)
+        if len(segs) > 0:
+            blocked |= intersect_circles_segs(next_pos, radii, segs, owners)
+
+        # Entities, other than the agents, in the XZ plane
+        ents = [
+            (ent.pos, ent.radius, i)
+            for i, world in enumerate(worlds)
+            for ent in world.entities
+            if ent is not world.agent
+        ]
+        if ents:
+            ent_pos, ent_radii, ent_owners = map(np.array, zip(*ents))
+            delta = (ent_pos - next_pos[ent_owners]) * np.array([1, 0, 1])
+            hits = np.linalg.norm(delta, axis=1) < radii[ent_owners] + ent_radii
+            blocked |= np.bincount(ent_owners[hits], minlength=len(worlds)) > 0
+
+        for i, world in enumerate(worlds):
+            key = world.move_key(*moves[i])
+            world.planned_move = (key, next_pos[i], bool(blocked[i]))
+
+    def _gather_walls(self, worlds):
+        """
+        Get the wall segments of some worlds, concatenated, and the index
+        of the world of each segment
+        """
+
+        # The segments are concatenated again whenever a layout changes
+        walls = [world.wall_segs for world in worlds]
+        if self._walls is None or not _same_arrays(walls, self._walls):
+            self._wall_segs = np.concatenate([world.wall_segs for world in worlds])
+            self._wall_owners = np.concatenate(
+                [np.full(len(world.wall_segs), i) for i, world in enumerate(worlds)]
+            ).astype(np.intp)
+            self._walls = walls
+
+        return self._wall_segs, self._wall_owners
+
+    def call(self, name, *args, **kwargs):
+        """
+        Call a method, or get an attribute, of each sub-environment
+        """
+
+        results = []
+        for env in self.envs:
+            function = getattr(env, name)
+            if callable(function):
+                results.append(function(*args, **kwargs))
+            else:
+                results.append(function)
+
+        return tuple(results)
+
+    def get_attr(self, name):
+        return self.call(name)
+
+    def set_attr(self, name, values):
+        """
+        Set an attribute of each sub-environment, either to a single
+        value or to one value per sub-environment
+        """
+
+        if not isinstance(values, (list, tuple)):
+            values = [values for _ in range(self.num_envs)]
+        assert len(values) == self.num_envs
+
+        for env, value in zip(self.envs, values):
+            setattr(env, name, value)
+
+    def close_extras(self, **kwargs):
+        # The first world owns the shared context, so it is closed last
+        for env in reversed(self.envs):
+            env.close()
+
+
+def _same_arrays(arrays, others):
+    return len(arrays) == len(others) and all(
+        array is other for array, other in zip(arrays, others)
+    )
+
+
+def _can_plan_move(world):
+    """
+    Check if the move of a world can be computed in a batch: the world
+    uses the base motion and collision code, and isn't carrying an object
+    """
+
+    cls = type(world)
+    return (
+        isinstance(world, MiniWorldEnv)
+        and cls.move_agent is MiniWorldEnv.move_agent
+        and cls.intersect is MiniWorldEnv.intersect
+        and not world.agent.carrying
+        and len(world.wall_segs) > 0
+    )
+
+
+def _worker(index, env_id, env_kwargs, num_envs, pipe, parent_pipe, shm, final_shm):
+    """
+    Worker process running one environment. Observations are rendered
+    directly into the worker's slot of the shared observation buffer, so
+    that only small messages cross the pipe.
+    """
+
+    parent_pipe.close()
+
+    env = gym.make(env_id, **env_kwargs)
+    world = env.unwrapped
+    space = world.observation_space
+    world.obs_buffer = read_from_shared_memory(space, shm, n=num_envs)[index]
+    final_obs = read_from_shared_memory(space, final_shm, n=num_envs)[index]
+
+    # Worlds are generated lazily, so reset once to load the textures and
+    # meshes of this environment. Every version of the textures is then
+    # uploaded, so domain randomization doesn't read files during a run
+    env.reset()
+    for tex_name in set(tex.name for tex in Texture.tex_cache.values()):
+        Texture.preload(tex_name)
+    for mesh in list(ObjMesh.cache.values()):
+        mesh.upload()
+
+    try:
+        while True:
+            command, data = pipe.recv()
+
+            if command == "reset":
+                seed, options = data
+                kwargs = {}
+                if seed is not None:
+                    kwargs["seed"] = seed
+                if options is not None:
+                    kwargs["options"] = options
+                _, info = env.reset(**kwargs)
+                pipe.send((info, True))
+
+            elif command == "step":
+                _, reward, terminated, truncated, info = env.step(data)
+
+                # The final observation is kept in its own buffer,
+                # since resetting overwrites the observation slot
+                if terminated or truncated:
+                    np.copyto(final_obs, world.obs_buffer)
+                    old_info = info
+                    _, info = env.reset()
+                    info["final_info"] = old_info
+
+                pipe.send(((reward, terminated, truncated, info), True))
+
+            elif command == "call":
+                name, args, kwargs = data
+                function = getattr(env, name)
+                if callable(function):
+                    pipe.send((function(*args, **kwargs), True))
+                else:
+                    pipe.send((function, True))
+
+            elif command == "set_attr":
+                name, value = data
+                setattr(env, name, value)
+                pipe.send((None, True))
+
+            elif command == "close":
+                pipe.send((None, True))
+                break
+
+            else:
+                raise RuntimeError("unknown worker command %s" % command)
+
+    except (KeyboardInterrupt, Exception):
+        error_type, error_message, _ = sys.exc_info()
+        pipe.send(((error_type, str(error_message), traceback.format_exc()), False))
+
+    finally:
+        env.close()
+
+
+class MiniWorldAsyncVectorEnv(gym.vector.VectorEnv):
+    """
+    Vectorized environment running each MiniWorld world in its own process.
+
+    Workers render their observations straight into a slot of a shared
+    memory (N, H, W, 3) array, so frames are never pickled. Only actions,
+    rewards, flags and info dicts cross the pipes.
+    """
+
+    def __init__(self, env_id, num_envs, copy=True, context="spawn", **kwargs):
+        """
+        env_id  -- id of the registered environment to run
+        num_envs -- number of worker processes
+        copy    -- if False, observations returned by reset and step are
+                   views of the shared buffer, overwritten on each step
+        context -- multiprocessing start method. The default is "spawn",
+                   since OpenGL contexts don't survive a fork
+        kwargs  -- arguments passed to gym.make in each worker
+        """
+
+        self.env_id = env_id
+        self.copy = copy
+        ctx = mp.get_context(context)
+
+        # Spaces are read from a temporary environment
+        dummy_env = gym.make(env_id, **kwargs)
+        observation_space = dummy_env.observation_space
+        action_space = dummy_env.action_space
+        dummy_env.close()
+        del dummy_env
+        assert isinstance(
+            observation_space, spaces.Box
+        ), "only image observations can be vectorized"
+
+        super().__init__(
+            num_envs=num_envs,
+            observation_space=observation_space,
+            action_space=action_space,
+        )
+
+        self._shm = create_shared_memory(observation_space, n=num_envs, ctx=ctx)
+        self._final_shm = create_shared_memory(observation_space, n=num_envs, ctx=ctx)
+        self.observations = read_from_shared_memory(
+            observation_space, self._shm, n=num_envs
+        )
+        self._final_observations = read_from_shared_memory(
+            observation_space, self._final_shm, n=num_envs
+        )
+
+        self.parent_pipes = []
+        self.processes = []
+        for index in range(num_envs):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                name="MiniWorldWorker-%d" % index,
+                args=(
+                    index,
+                    env_id,
+                    kwargs,
+                    num_envs,
+                    child_pipe,
+                    parent_pipe,
+                    self._shm,
+                    self._final_shm,
+                ),
+                daemon=True,
+            )
+            self.parent_pipes.append(parent_pipe)
+            self.processes.append(process)
+            process.start()
+            child_pipe.close()
+
+        self._rewards = np.zeros((self.num_envs,), dtype=np.float64)
+        self._terminateds = np.zeros((self.num_envs,), dtype=np.bool_)
+        self._truncateds = np.zeros((self.num_envs,), dtype=np.bool_)
+
+    def _recv(self, pipe):
+        """
+        Receive the result of a command, raising worker errors
+        """
+
+        result, success = pipe.recv()
+        if not success:
+            error_type, error_message, worker_traceback = result
+            self.close_extras(terminate=True)
+            raise error_type(
+                "%s\n\nWorker traceback:\n%s" % (error_message, worker_traceback)
+            )
+        return result
+
+    def reset_async(self, seed=None, options=None):
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        for pipe, single_seed in zip(self.parent_pipes, seed):
+            pipe.send(("reset", (single_seed, options)))
+
+    def reset_wait(self, seed=None, options=None):
+        """
+        Wait for all the sub-environments to be reset
+        """
+
+        infos = {}
+        for i, pipe in enumerate(self.parent_pipes):
+            info = self._recv(pipe)
+            infos = self._add_info(infos, info, i)
+
+        obs = deepcopy(self.observations) if self.copy else self.observations
+        return obs, infos
+
+    def step_async(self, actions):
+        for pipe, action in zip(self.parent_pipes, iterate(self.action_space, actions)):
+            pipe.send(("step", action))
+
+    def step_wait(self):
+        """
+        Wait for all the sub-environments to be stepped
+        """
+
+        infos = {}
+        for i, pipe in enumerate(self.parent_pipes):
+            (
+                self._rewards[i],
+                self._terminateds[i],
+                self._truncateds[i],
+                info,
+            ) = self._recv(pipe)
+
+            if self._terminateds[i] or self._truncateds[i]:
+                info["final_observation"] = self._final_observations[i].copy()
+
+            infos = self._add_info(infos, info, i)
+
+        obs = deepcopy(self.observations) if self.copy else self.observations
+        return (
+            obs,
+            np.copy(self._rewards),
+            np.copy(self._terminateds),
+            np.copy(self._truncateds),
+            infos,
+        )
+
+    def call(self, name, *args, **kwargs):
+        """
+        Call a method, or get an attribute, of each sub-environment
+        """
+
+        for pipe in self.parent_pipes:
+            pipe.send(("call", (name, args, kwargs)))
+
+        return tuple(self._recv(pipe) for pipe in self.parent_pipes)
+
+    def get_attr(self, name):
+        return self.call(name)
+
+    def set_attr(self, name, values):
+        """
+        Set an attribute of each sub-environment, either to a single
+        value or to one value per sub-environment
+        """
+
+        if not isinstance(values, (list, tuple)):
+            values = [values for _ in range(self.num_envs)]
+        assert len(values) == self.num_envs
+
+        for pipe, value in zip(self.parent_pipes, values):
+            pipe.send(("set_attr", (name, value)))
+        for pipe in self.parent_pipes:
+            self._recv(pipe)
+
+    def close_extras(self, timeout=None, terminate=False):
+        if terminate:
+            for process in self.processes:
+                if process.is_alive():
+                    process.terminate()
+        else:
+            for pipe in self.parent_pipes:
+                if not pipe.closed:
+                    pipe.send(("close", None))
+            for pipe in self.parent_pipes:
+                if not pipe.closed:
+                    pipe.recv()
+
+        for pipe in self.parent_pipes:
+            pipe.close()
+        for process in self.processes:
+            process.join(timeout)
+
+
+class MiniWorldEnvPool(MiniWorldAsyncVectorEnv):
+    """
+    Asynchronous pool of MiniWorld workers. Actions are sent to any subset
+    of the environments, and results are received for whichever
+    environments finish first, so that slow resets and steps are hidden
+    behind progress on the other environments.
+
+    Usage:
+        pool.async_reset()
+        while True:
+            obs, rewards, terminated, truncated, info = pool.recv()
+            pool.send(policy(obs), info["env_id"])
+    """
+
+    def __init__(self, env_id, num_envs, batch_size=None, **kwargs):
+        """
+        batch_size -- default number of environments returned by recv
+        """
+
+        super().__init__(env_id, num_envs, **kwargs)
+
+        if batch_size is None:
+            batch_size = num_envs
+        assert 0 < batch_size <= num_envs
+        self.batch_size = batch_size
+
+        # Command each environment is currently running, if any
+        self._pending = [None] * num_envs
+
+    def _assert_idle(self):
+        assert all(
+            command is None for command in self._pending
+        ), "the results of all the pending environments must be received first"
+
+    def reset_async(self, seed=None, options=None):
+        self._assert_idle()
+        super().reset_async(seed=seed, options=options)
+
+    def step_async(self, actions):
+        self._assert_idle()
+        super().step_async(actions)
+
+    def call(self, name, *args, **kwargs):
+        self._assert_idle()
+        return super().call(name, *args, **kwargs)
+
+    def set_attr(self, name, values):
+        self._assert_idle()
+        super().set_attr(name, values)
+
+    def _send(self, env_id, command, data):
+        pending = self._pending[env_id]
+        assert pending is None, f"environment {env_id} has a pending {pending}"
+        self.parent_pipes[env_id].send((command, data))
+        self._pending[env_id] = command
+
+    def async_reset(self, seed=None, options=None):
+        """
+        Start resetting all the environments
+        Results are returned by recv, like those of steps
+        """
+
+        if seed is None:
+            seed = [None for _ in range(self.num_envs)]
+        if isinstance(seed, int):
+            seed = [seed + i for i in range(self.num_envs)]
+        assert len(seed) == self.num_envs
+
+        for env_id, single_seed in enumerate(seed):
+            self._send(env_id, "reset", (single_seed, options))
+
+    def send(self, actions, env_ids=None):
+        """
+        Start stepping the given environments, one action per environment
+        """
+
+        if env_ids is None:
+            env_ids = range(self.num_envs)
+
+        for action, env_id in zip(actions, env_ids):
+            self._send(int(env_id), "step", action)
+
+    def recv(self, batch_size=None, timeout=None):
+        """
+        Wait for the first batch_size environments to be ready, and return
+        their observations, rewards, termination and truncation flags.
+        The ids of the environments are given by info["env_id"].
+        """
+
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        waiting = {
+            self.parent_pipes[env_id]: env_id
+            for env_id, command in enumerate(self._pending)
+            if command is not None
+        }
+        assert batch_size <= len(waiting), "not enough pending environments"
+
+        env_ids = []
+        while len(env_ids) < batch_size:
+            ready = wait(list(waiting.keys()), timeout)
+            if len(ready) == 0:
+                raise TimeoutError("no environment ready after %s seconds" % timeout)
+            for pipe in ready[: batch_size - len(env_ids)]:
+                env_ids.append(waiting.pop(pipe))
+
+        rewards = np.zeros((batch_size,), dtype=np.float64)
+        terminateds = np.zeros((batch_size,), dtype=np.bool_)
+        truncateds = np.zeros((batch_size,), dtype=np.bool_)
+
+        infos = {}
+        for i, env_id in enumerate(env_ids):
+            result = self._recv(self.parent_pipes[env_id])
+            command = self._pending[env_id]
+            self._pending[env_id] = None
+
+            if command == "reset":
+                info = result
+            else:
+                rewards[i], terminateds[i], truncateds[i], info = result
+                if terminateds[i] or truncateds[i]:
+                    info["final_observation"] = self._final_observations[env_id].copy()
+
+            infos = self._add_info(infos, info, env_id)
+
+        # Info arrays are indexed by environment, keep the batch entries
+        env_ids = np.array(env_ids)
+        infos = {key: value[env_ids] for key, value in infos.items()}
+        infos["env_id"] = env_ids
+
+        # Fancy indexing copies the observations out of the shared buffer
+        obs = self.observations[env_ids]
+
+        return obs, rewards, terminateds, truncateds, infos
+
+    def close_extras(self, timeout=None, terminate=False):
+        # Drain the results of the commands still running
+        if not terminate:
+            for env_id, command in enumerate(self._pending):
+                if command is not None:
+                    self.parent_pipes[env_id].recv()
+                    self._pending[env_id] = None
+
+        super().close_extras(timeout=timeout, terminate=terminate)
+
+
+def make_vector_env(env_id, num_envs, copy=True, asynchronous=False, **kwargs):
+    """
+    Create a vectorized environment from a registered environment id
+    If asynchronous is set, each environment runs in its own process
+    """
+
+    if asynchronous:
+        return MiniWorldAsyncVectorEnv(env_id, num_envs, copy=copy, **kwargs)
+
+    def make_env():
+        return gym.make(env_id, **kwargs)
+
+    return MiniWorldVectorEnv([make_env for _ in range(num_envs)], copy=copy)
@@ -40,3 +40,364 @@ class GreyscaleWrapper(gym.ObservationWrapper):
         obs = 0.30 * obs[:, :, 0] + 0.59 * obs[:, :, 1] + 0.11 * obs[:, :, 2]
 
         return np.expand_dims(obs, axis=2)
+
+
+# Weights of the RGB channels in greyscale conversions
+GREY_WEIGHTS = np.array([0.30, 0.59, 0.11], dtype=np.float32)
+
+
+class ObservationPipeline(gym.ObservationWrapper):
+    """
+    Preprocess image observations in a single pass into reused buffers:
+    resizing, greyscale conversion, channel layout, dtype conversion and
+    scaling, and frame stacking, in that order. This replaces a stack of
+    wrappers each allocating new arrays on every step:
+
+        env = ObservationPipeline(
+            env, size=(42, 42), greyscale=True, layout="chw",
+            dtype=np.float32, scale=1 / 255, num_stack=4,
+        )
+
+    Resizing picks the nearest pixel. Rendering observations at the
+    target size, with obs_width and obs_height, is cheaper still.
+    Stacked frames are concatenated along the channel axis, oldest first.
+    """
+
+    def __init__(
+        self,
+        env,
+        size=None,
+        greyscale=False,
+        layout="hwc",
+        dtype=None,
+        scale=1.0,
+        num_stack=1,
+        copy=True,
+    ):
+        """
+        size      -- (height, width) to resize observations to
+        greyscale -- convert observations to a single greyscale channel
+        layout    -- "hwc", or "chw" for PyTorch
+        dtype     -- dtype of the observations, by default that of the env
+        scale     -- factor the observations are multiplied by, 1 / 255 to
+                     normalize pixel values
+        num_stack -- number of frames stacked
+        copy      -- if False, observations are views of the internal
+                     buffer, overwritten on each step
+        """
+
+        super().__init__(env)
+        assert layout in ["hwc", "chw"]
+        assert num_stack >= 1
+
+        space = self.observation_space
+        assert len(space.shape) == 3, "only image observations can be processed"
+        in_height, in_width, in_channels = space.shape
+
+        height, width = size if size is not None else (in_height, in_width)
+        channels = 1 if greyscale else in_channels
+        dtype = np.dtype(dtype if dtype is not None else space.dtype)
+
+        self.greyscale = greyscale
+        self.layout = layout
+        self.scale = scale
+        self.num_stack = num_stack
+        self.channels = channels
+        self.copy = copy
+
+        # Index of the source value of each output value, in the
+        # flattened observation
+        self._index = None
+        self._resized = None
+        if (height, width) != (in_height, in_width):
+            rows = ((np.arange(height) + 0.5) * in_height / height).astype(np.intp)
+            cols = ((np.arange(width) + 0.5) * in_width / width).astype(np.intp)
+            pixels = rows[:, None] * in_width + cols[None, :]
+            self._index = pixels[:, :, None] * in_channels + np.arange(in_channels)
+            self._resized = np.zeros((height, width, in_channels), dtype=space.dtype)
+
+        # Greyscale conversions are done in float32, which is much faster
+        # than mixing integer pixels and float weights
+        self._float = None
+        self._grey = None
+        if greyscale:
+            self._float = np.zeros((height, width, in_channels), dtype=np.float32)
+            self._grey = np.zeros((height, width, 1), dtype=np.float32)
+
+        # Stacked frames, the newest frame last
+        if layout == "hwc":
+            shape = (height, width, channels * num_stack)
+        else:
+            shape = (channels * num_stack, height, width)
+        self.buffer = np.zeros(shape, dtype=dtype)
+
+        # View of the slot of the newest frame, in (height, width, channels) order
+        if layout == "hwc":
+            self._newest = self.buffer[:, :, -channels:]
+        else:
+            self._newest = self.buffer[-channels:].transpose(1, 2, 0)
+
+        low = np.min(space.low) * scale
+        high = np.max(space.high) * scale
+        if np.issubdtype(dtype, np.integer):
+            low = max(low, np.iinfo(dtype).min)
+            high = min(high, np.iinfo(dtype).max)
+        self.observation_space = gym.spaces.Box(low, high, shape, dtype=dtype)
+
+    def reset(self, *, seed=None, options=None):
+        obs, info = self.env.reset(seed=seed, options=options)
+
+        # Fill the whole stack with the first frame
+        self._write(obs)
+        if self.num_stack > 1:
+            newest = self._stack_slice(self.num_stack - 1)
+            for i in range(self.num_stack - 1):
+                self.buffer[self._stack_slice(i)] = self.buffer[newest]
+
+        return self._output(), info
+
+    def observation(self, observation):
+        # Shift the stack by one frame, dropping the oldest one
+        if self.num_stack > 1:
+            c = self.channels
+            if self.layout == "hwc":
+                self.buffer[:, :, :-c] = self.buffer[:, :, c:]
+            else:
+                self.buffer[:-c] = self.buffer[c:]
+
+        self._write(observation)
+        return self._output()
+
+    def _stack_slice(self, i):
+        channels = slice(i * self.channels, (i + 1) * self.channels)
+        if self.layout == "hwc":
+            return (slice(None), slice(None), channels)
+        return (channels,)
+
+    def _write(self, obs):
+        """
+        Process an observation into the slot of the newest frame
+        """
+
+        frame = obs
+        if self._index is not None:
+            np.take(obs.reshape(-1), self._index, out=self._resized)
+            frame = self._resized
+
+        if self.greyscale:
+            np.copyto(self._float, frame)
+            np.matmul(self._float, GREY_WEIGHTS, out=self._grey[:, :, 0])
+            frame = self._grey
+
+        if self.scale != 1.0:
+            np.multiply(frame, self.scale, out=self._newest, casting="unsafe")
+        else:
+            np.copyto(self._newest, frame, casting="unsafe")
+
+    def _output(self):
+        return self.buffer.copy() if self.copy else self.buffer
+
+
+class FrameRing:
+    """
+    Ring buffer of the last frames of one or more environments, in which
+    the stack of the last frames of each env is always a contiguous view.
+
+    Each frame is written twice, num_stack slots apart, so that the last
+    num_stack frames are always consecutive in the buffer. Pushing a frame
+    copies a single frame, whatever the size of the stack.
+    """
+
+    def __init__(self, num_envs, num_stack, frame_shape, dtype):
+        assert num_stack >= 1
+        self.num_stack = num_stack
+        self.frame_ndim = len(frame_shape)
+        self.frames = np.zeros(
+            (num_envs, 2 * num_stack) + tuple(frame_shape), dtype=dtype
+        )
+
+        # Slot of the newest frame, in the first half of the buffer
+        self.newest = num_stack - 1
+
+    def next_slot(self):
+        """
+        Get a view of the slot the next frame of each env goes into
+        """
+
+        return self.frames[:, (self.newest + 1) % self.num_stack]
+
+    def push(self, frames=None):
+        """
+        Make the frames in the next slot the newest ones,
+        copying frames into the slot first if given
+        """
+
+        slot = (self.newest + 1) % self.num_stack
+        if frames is not None:
+            self.frames[:, slot] = frames
+        self.frames[:, slot + self.num_stack] = self.frames[:, slot]
+        self.newest = slot
+
+    def fill(self, index):
+        """
+        Fill the stacks of the envs at an index with their newest frame,
+        as at the start of an episode
+        """
+
+        newest = self.frames[index, self.newest]
+        self.frames[index] = np.expand_dims(newest, -self.frame_ndim - 1)
+
+    def stack(self):
+        """
+        Get a view of the last frames of each env, oldest first
+        """
+
+        start = self.newest + 1
+        return self.frames[:, start : start + self.num_stack]
+
+
+def _stacked_space(space, num_stack):
+    return gym.spaces.Box(
+        np.repeat(space.low[None], num_stack, axis=0),
+        np.repeat(space.high[None], num_stack, axis=0),
+        dtype=space.dtype,
+    )
+
+
+class FrameStack(gym.Wrapper):
+    """
+    Stack the last num_stack observations along a new leading axis,
+    oldest first, with the stack of the first step filled with the
+    first observation.
+
+    Observations are rendered directly into a ring buffer, so stacking
+    costs one frame copy per step. Unless copy is set, the observations
+    returned are views of the ring buffer, valid until the next step;
+    call stack() to get a copy that outlives it.
+    """
+
+    def __init__(self, env, num_stack, copy=False):
+        super().__init__(env)
+        self.num_stack = num_stack
+        self.copy = copy
+
+        space = self.observation_space
+        self.ring = FrameRing(1, num_stack, space.shape, space.dtype)
+        self.observation_space = _stacked_space(space, num_stack)
+
+        # Observations are only rendered into the ring buffer when the
+        # wrappers in between don't transform them
+        base_space = self.unwrapped.observation_space
+        self.direct = (
+            hasattr(self.unwrapped, "obs_buffer")
+            and base_space.shape == space.shape
+            and base_space.dtype == space.dtype
+        )
+
+    def reset(self, **kwargs):
+        obs, info = self._render(self.env.reset, **kwargs)
+        self.ring.fill(0)
+        return self._output(), info
+
+    def step(self, action):
+        obs, reward, termination, truncation, info = self._render(self.env.step, action)
+        return self._output(), reward, termination, truncation, info
+
+    def frames(self):
+        """
+        Get views of the stacked frames, oldest first
+        """
+
+        return list(self.ring.stack()[0])
+
+    def stack(self):
+        """
+        Get a copy of the stacked frames
+        """
+
+        return self.ring.stack()[0].copy()
+
+    def _render(self, fn, *args, **kwargs):
+        """
+        Call reset or step with the observation rendered into the next
+        slot of the ring buffer, and push it
+        """
+
+        env = self.unwrapped
+        slot = self.ring.next_slot()[0]
+
+        # The buffer is only lent for the call, so that other renders
+        # can't overwrite frames of the stack
+        direct = self.direct
+        if direct:
+            obs_buffer = env.obs_buffer
+            env.obs_buffer = slot
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            if direct:
+                env.obs_buffer = obs_buffer
+
+        # Observations that weren't rendered, or were transformed
+        # by other wrappers, are copied, in the dtype of their space
+        obs = result[0]
+        if obs is not slot:
+            np.copyto(slot, obs, casting="unsafe")
+        self.ring.push()
+
+        return result
+
+    def _output(self):
+        stack = self.ring.stack()[0]
+        return stack.copy() if self.copy else stack
+
+
+class VectorFrameStack(gym.vector.VectorEnvWrapper):
+    """
+    Stack the last num_stack observations of each env of a vector env,
+    along a new axis after the env axis. The stack of an env is filled
+    with the first observation of each of its episodes.
+
+    Stacking costs one frame copy per env and step. Unless copy is set,
+    the observations returned are views of the ring buffer, valid until
+    the next step.
+    """
+
+    def __init__(self, env, num_stack, copy=False):
+        super().__init__(env)
+        self.num_stack = num_stack
+        self.copy = copy
+
+        space = env.single_observation_space
+        self.ring = FrameRing(env.num_envs, num_stack, space.shape, space.dtype)
+        self.single_observation_space = _stacked_space(space, num_stack)
+        self.observation_space = gym.vector.utils.batch_space(
+            self.single_observation_space, env.num_envs
+        )
+
+    def reset_wait(self, **kwargs):
+        obs, infos = self.env.reset_wait(**kwargs)
+        self.ring.push(obs)
+        self.ring.fill(slice(None))
+        return self._output(), infos
+
+    def step_wait(self):
+        obs, rewards, terminations, truncations, infos = self.env.step_wait()
+        self.ring.push(obs)
+
+        # Envs are reset automatically at the end of their episodes
+        for index in np.flatnonzero(np.logical_or(terminations, truncations)):
+            self.ring.fill(index)
+
+        return self._output(), rewards, terminations, truncations, infos
+
+    def stack(self):
+        """
+        Get a copy of the stacked frames of all the envs
+        """
+
+        return self.ring.stack().copy()
+
+    def _output(self):
+        stack = self.ring.stack()
+        return stack.copy() if self.copy else stack
@@ -1,50 +1,262 @@
 #!/usr/bin/env python3
 
+"""
+Benchmark the construction, reset, step and rendering times of the
+environments, at several observation resolutions.
+
+Results are written as JSON, along with metadata about the machine,
+and two result files can be compared to find regressions:
+
+    ./benchmark.py --output before.json
+    ./benchmark.py --output after.json
+    ./benchmark.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
 import time
 
 import gymnasium as gym
+import numpy as np
+
+import miniworld
+
+
+def parse_resolution(text):
+    width, height = text.split("x")
+    return int(width), int(height)
+
+
+def cpu_name():
+    """
+    Get the model name of the CPU, falling back to the processor type
+    """
+
+    try:
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+
+    return platform.processor()
+
+
+def gl_metadata():
+    """
+    Get the OpenGL renderer, vendor and version strings
+    Only valid while an OpenGL context exists
+    """
+
+    from pyglet.gl import gl_info
+
+    return {
+        "gl_renderer": gl_info.get_renderer(),
+        "gl_vendor": gl_info.get_vendor(),
+        "gl_version": gl_info.get_version(),
+    }
+
+
+def metadata():
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "gymnasium": gym.__version__,
+        "cpu": cpu_name(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def time_ms(fn, duration, min_calls=3):
+    """
+    Median time in milliseconds of a function call, calling it repeatedly
+    for at least the given duration, in seconds
+    """
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_calls or time.perf_counter() - start < duration:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    return 1000 * float(np.median(times))
+
+
+def benchmark_env(env_id, width, height, duration, seed=0, metadata=None):
+    """
+    Measure the times of the different operations of an environment,
+    adding the OpenGL strings to metadata if given
+    """
+
+    results = {}
+
+    t0 = time.perf_counter()
+    env = gym.make(env_id, obs_width=width, obs_height=height)
+    results["construction"] = 1000 * (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    env.reset(seed=seed)
+    results["first_reset"] = 1000 * (time.perf_counter() - t0)
+
+    results["reset"] = time_ms(env.reset, duration)
+
+    world = env.unwrapped
+    env.action_space.seed(seed)
+    env.reset(seed=seed)
+
+    def step():
+        _, _, termination, truncation, _ = env.step(env.action_space.sample())
+        if termination or truncation:
+            env.reset()
+
+    # Episode resets are included, as they are part of stepping through
+    # episodes, but they are rare enough not to skew the median
+    results["step"] = time_ms(step, duration)
+
+    # The previous frame would otherwise be reused, as nothing moves
+    def render_obs():
+        world.invalidate_obs()
+        world.render_obs()
+
+    def render_depth():
+        world.invalidate_obs()
+        world.render_depth()
+
+    results["render_obs"] = time_ms(render_obs, duration)
+    results["render_depth"] = time_ms(render_depth, duration)
+    results["render_top_view"] = time_ms(world.render_top_view, duration)
+    results["get_visible_ents"] = time_ms(world.get_visible_ents, duration)
+
+    # The GL context only exists while an environment is open
+    if metadata is not None and "gl_renderer" not in metadata:
+        metadata.update(gl_metadata())
+
+    env.close()
+
+    return results
+
+
+def run(args):
+    env_ids = args.env_name or miniworld.envs.env_ids
+    resolutions = [parse_resolution(r) for r in args.resolutions.split(",")]
+
+    output = {"metadata": metadata(), "results": {}}
+
+    for env_id in env_ids:
+        output["results"][env_id] = {}
+        for width, height in resolutions:
+            key = f"{width}x{height}"
+            try:
+                results = benchmark_env(
+                    env_id, width, height, args.duration, metadata=output["metadata"]
+                )
+            except Exception as e:
+                results = {"error": repr(e)}
+            output["results"][env_id][key] = results
+
+            if "error" in results:
+                print(f"{env_id} {key}: {results['error']}")
+            else:
+                times = ", ".join(f"{k} {v:.2f}" for k, v in results.items())
+                print(f"{env_id} {key}: {times} (ms)")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(output, file, indent=2)
+
+    return 0
+
+
+def compare(base_path, new_path, threshold):
+    """
+    Compare two result files, flagging the times which got slower by more
+    than the threshold. Returns the number of regressions.
+    """
 
-# import miniworld
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
 
-# Benchmark loading time
-st = time.time()
-env = gym.make("MiniWorld-Maze-v0")
-env.seed(0)
-env.reset()
-load_time = 1000 * (time.time() - st)
+    for name in ["cpu", "gl_renderer"]:
+        if base["metadata"].get(name) != new["metadata"].get(name):
+            print(f"warning: {name} differs between runs")
 
-# Benchmark the reset time
-st = time.time()
-for i in range(100):
-    env.reset()
-reset_time = 1000 * (time.time() - st) / 100
+    num_regressions = 0
+    for env_id, resolutions in new["results"].items():
+        for resolution, results in resolutions.items():
+            base_results = base["results"].get(env_id, {}).get(resolution, {})
+            for name, value in results.items():
+                base_value = base_results.get(name)
+                if name == "error" or not isinstance(base_value, float):
+                    continue
 
-# Benchmark the rendering/update speed
-num_frames = 0
-st = time.time()
+                ratio = value / base_value if base_value > 0 else 1.0
+                flag = ""
+                if ratio > 1 + threshold:
+                    flag = "REGRESSION"
+                    num_regressions += 1
+                elif ratio < 1 - threshold:
+                    flag = "improvement"
+                print(
+                    f"{env_id:40} {resolution:9} {name:17} "
+                    f"{base_value:9.3f} {value:9.3f} {ratio:6.2f}x {flag}"
+                )
 
-while True:
-    dt = time.time() - st
+    print()
+    print(f"{num_regressions} regression(s)")
 
-    if dt > 5:
-        break
+    return num_regressions
 
-    # Slow movement speed to minimize resets
-    action = 0
-    obs, reward, termination, truncation, info = env.step(action)
 
-    if termination or truncation:
-        env.reset()
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--env-name",
+        action="append",
+        help="environment to benchmark, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--resolutions",
+        default="80x60,160x120,320x240",
+        help="comma-separated observation resolutions, as WIDTHxHEIGHT",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=1.0,
+        help="time spent measuring each operation, in seconds",
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASE", "NEW"),
+        help="compare two result files instead of running the benchmark",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown above which a time is flagged as a regression",
+    )
+    args = parser.parse_args()
 
-    num_frames += 1
+    if args.compare:
+        num_regressions = compare(*args.compare, args.threshold)
+        return 1 if num_regressions > 0 else 0
 
-fps = num_frames / dt
-frame_time = 1000 * dt / num_frames
+    return run(args)
 
-print()
-print(f"load time: {int(load_time)} ms")
-print(f"reset time: {reset_time:,.1f} ms")
-print(f"frame time: {frame_time:,.1f} ms")
-print(f"frame rate: {fps:,.1f} FPS")
 
-env.close()
+if __name__ == "__main__":
+    sys.exit(main())
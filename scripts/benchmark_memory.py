@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark the memory footprint of the environments, as more and more
+instances are created in the same process.
+
+After each instance is created, reset and stepped, the growth of the
+resident memory of the process is reported along with the host and
+estimated GL memory of the instance and of the caches shared by all
+the instances:
+
+    ./benchmark_memory.py --env-name MiniWorld-Maze-v0 --num-envs 16
+"""
+
+import argparse
+import json
+import sys
+
+import gymnasium as gym
+
+import miniworld
+from miniworld.memory import process_rss
+
+MB = 2**20
+
+
+def benchmark_env(env_id, num_envs, num_steps, seed=0):
+    """
+    Create instances of an environment one at a time, recording the
+    memory used after each one is created
+    """
+
+    envs = []
+    records = []
+    base_rss = process_rss()
+
+    for i in range(num_envs):
+        env = gym.make(env_id)
+        env.reset(seed=seed + i)
+        env.action_space.seed(seed + i)
+        for _ in range(num_steps):
+            _, _, termination, truncation, _ = env.step(env.action_space.sample())
+            if termination or truncation:
+                env.reset()
+        envs.append(env)
+
+        report = env.unwrapped.memory_report()
+        records.append(
+            {
+                "num_envs": i + 1,
+                "rss_delta": report["process_rss"] - base_rss,
+                "env_total": report["env_total"],
+                "shared_total": report["shared_total"],
+                "env": report["env"],
+                "shared": report["shared"],
+            }
+        )
+
+    for env in envs:
+        env.close()
+
+    return records
+
+
+def print_records(env_id, records):
+    print(env_id)
+    print(
+        f"{'envs':>5} {'rss delta':>10} {'env host':>9} {'env gl':>9} "
+        f"{'shared host':>11} {'shared gl':>10} (MB)"
+    )
+    for record in records:
+        print(
+            f"{record['num_envs']:5} "
+            f"{record['rss_delta'] / MB:10.1f} "
+            f"{record['env_total']['host_bytes'] / MB:9.2f} "
+            f"{record['env_total']['gl_bytes'] / MB:9.2f} "
+            f"{record['shared_total']['host_bytes'] / MB:11.2f} "
+            f"{record['shared_total']['gl_bytes'] / MB:10.2f}"
+        )
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--env-name",
+        action="append",
+        help="environment to benchmark, may be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--num-envs",
+        type=int,
+        default=8,
+        help="number of instances created in the process",
+    )
+    parser.add_argument(
+        "--num-steps",
+        type=int,
+        default=10,
+        help="number of steps taken by each instance before measuring",
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    if process_rss() is None:
+        print("the resident memory of the process can't be measured")
+        return 1
+
+    env_ids = args.env_name or miniworld.envs.env_ids
+
+    output = {}
+    for env_id in env_ids:
+        output[env_id] = benchmark_env(env_id, args.num_envs, args.num_steps)
+        print_records(env_id, output[env_id])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(output, file, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark how the step throughput of the environments scales with the
+number of worker processes.
+
+Each worker runs its own environment in its own process, stepping it
+with random actions for a fixed duration. All the workers start stepping
+at the same time, and the aggregate steps per second and the per-step
+latency percentiles are reported for each worker count:
+
+    ./benchmark_scaling.py --env-name MiniWorld-Hallway-v0 --workers 1,2,4,8
+
+Without a GPU, rendering goes through llvmpipe, which runs its own
+rasterizer threads. --lp-threads sets LP_NUM_THREADS in the workers,
+and --pin pins each worker to its own CPU, so that the contention between
+the rasterizer threads of the workers can be measured.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+
+import gymnasium as gym
+import numpy as np
+
+import miniworld
+
+# Latency percentiles reported
+PERCENTILES = [50, 90, 99]
+
+# Time allowed for the workers to create and warm up their environments,
+# in seconds
+STARTUP_TIMEOUT = 300
+
+
+def parse_ints(text):
+    return [int(value) for value in text.split(",")]
+
+
+def _worker(index, env_id, duration, warmup, pin, barrier, results):
+    if pin:
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+
+    env = gym.make(env_id)
+    env.reset(seed=index)
+    env.action_space.seed(index)
+
+    def step():
+        _, _, termination, truncation, _ = env.step(env.action_space.sample())
+        if termination or truncation:
+            env.reset()
+
+    # Let caches and the rasterizer warm up before the measurement
+    for _ in range(warmup):
+        step()
+
+    # A worker failing before the barrier breaks it for all the others
+    barrier.wait(timeout=STARTUP_TIMEOUT)
+
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        t0 = time.perf_counter()
+        step()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    env.close()
+    results.put((index, elapsed, latencies))
+
+
+def benchmark_workers(env_id, num_workers, args):
+    """
+    Run a number of workers concurrently and aggregate their measurements
+    """
+
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(num_workers)
+    results = ctx.Queue()
+
+    processes = [
+        ctx.Process(
+            target=_worker,
+            args=(i, env_id, args.duration, args.warmup, args.pin, barrier, results),
+            daemon=True,
+        )
+        for i in range(num_workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # Results are read before joining, as workers can't exit with data queued.
+    # Workers which die without a result are reported instead of waited for.
+    worker_results = []
+    deadline = time.monotonic() + STARTUP_TIMEOUT + args.duration
+    while len(worker_results) < num_workers:
+        try:
+            worker_results.append(results.get(timeout=1))
+            continue
+        except queue.Empty:
+            pass
+
+        failed = [p for p in processes if p.exitcode not in (None, 0)]
+        if failed or time.monotonic() > deadline:
+            for process in processes:
+                process.terminate()
+            codes = ", ".join(str(p.exitcode) for p in failed)
+            raise RuntimeError(
+                f"{len(failed)} of {num_workers} workers failed "
+                f"(exit codes: {codes or 'none, timed out'})"
+            )
+
+    for process in processes:
+        process.join()
+
+    latencies = np.concatenate([np.array(r[2]) for r in worker_results])
+    steps_per_sec = sum(len(r[2]) / r[1] for r in worker_results)
+
+    record = {
+        "env_id": env_id,
+        "workers": num_workers,
+        "steps_per_sec": steps_per_sec,
+        "steps_per_sec_per_worker": steps_per_sec / num_workers,
+    }
+    for p in PERCENTILES:
+        record[f"latency_p{p}_ms"] = 1000 * float(np.percentile(latencies, p))
+    return record
+
+
+def write_csv(path, records):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(records[0].keys()))
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def plot(path, records):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    for env_id in dict.fromkeys(r["env_id"] for r in records):
+        env_records = [r for r in records if r["env_id"] == env_id]
+        ax.plot(
+            [r["workers"] for r in env_records],
+            [r["steps_per_sec"] for r in env_records],
+            marker="o",
+            label=env_id,
+        )
+    ax.set_xlabel("workers")
+    ax.set_ylabel("steps per second")
+    ax.legend()
+    fig.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--env-name",
+        action="append",
+        help="environment to benchmark, may be repeated (default: MiniWorld-Hallway-v0)",
+    )
+    parser.add_argument(
+        "--workers",
+        default="1,2,4,8",
+        help="comma-separated worker counts",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=5.0,
+        help="time spent stepping by each worker, in seconds",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=20,
+        help="steps taken by each worker before the measurement",
+    )
+    parser.add_argument(
+        "--pin", action="store_true", help="pin each worker to its own CPU"
+    )
+    parser.add_argument(
+        "--lp-threads",
+        type=int,
+        help="number of llvmpipe rasterizer threads of each worker",
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--csv", help="CSV file to write the results to")
+    parser.add_argument("--plot", help="image file to plot the throughput curve to")
+    args = parser.parse_args()
+
+    # Spawned workers inherit the environment of this process
+    if args.lp_threads is not None:
+        os.environ["LP_NUM_THREADS"] = str(args.lp_threads)
+
+    env_ids = args.env_name or ["MiniWorld-Hallway-v0"]
+    for env_id in env_ids:
+        assert env_id in miniworld.envs.env_ids, f"unknown environment {env_id}"
+
+    records = []
+    for env_id in env_ids:
+        for num_workers in parse_ints(args.workers):
+            try:
+                record = benchmark_workers(env_id, num_workers, args)
+            except RuntimeError as e:
+                print(f"{env_id} {num_workers:3} workers: {e}")
+                return 1
+            records.append(record)
+            latencies = ", ".join(
+                f"p{p} {record[f'latency_p{p}_ms']:.2f}" for p in PERCENTILES
+            )
+            print(
+                f"{env_id} {num_workers:3} workers: "
+                f"{record['steps_per_sec']:8.1f} steps/s, "
+                f"latency {latencies} (ms)"
+            )
+
+    metadata = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "cpu_count": os.cpu_count(),
+        "pin": args.pin,
+        "lp_threads": args.lp_threads,
+        "duration": args.duration,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"metadata": metadata, "results": records}, file, indent=2)
+    if args.csv:
+        write_csv(args.csv, records)
+    if args.plot:
+        plot(args.plot, records)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
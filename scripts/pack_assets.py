@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+"""
+Pack the textures and meshes of the package, pre-decoded, into a single
+asset archive. Once built, the archive is memory-mapped and textures and
+meshes are read from it instead of being decoded from their files:
+
+    ./pack_assets.py
+
+The archive is written to the package directory by default. Another
+location can be used by setting MINIWORLD_ASSET_ARCHIVE when building
+and when running the environments. The archive is built locally, and
+isn't part of the distributed package.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from miniworld.assets import ARCHIVE_FILE, build_archive
+from miniworld.utils import get_subdir_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--output",
+        default=os.environ.get(
+            "MINIWORLD_ASSET_ARCHIVE", get_subdir_path(ARCHIVE_FILE)
+        ),
+        help="path of the archive to write",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="print the files as they are packed"
+    )
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    build_archive(args.output, verbose=args.verbose)
+    size = os.path.getsize(args.output) / 2**20
+    print(f"{args.output}: {size:.1f} MB, in {time.perf_counter() - t0:.1f} s")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import pytest
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: microbenchmark, only run when selected with -m"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks only measure timings, so plain test runs skip them
+    if "benchmark" in config.getoption("markexpr"):
+        return
+
+    skip = pytest.mark.skip(reason="benchmark, select with -m benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
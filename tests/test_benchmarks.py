@@ -0,0 +1,199 @@
+"""
+Microbenchmarks of the hot paths of the simulator, on pinned inputs.
+
+Each benchmark reports the median time of a call, in microseconds.
+Benchmarks are skipped unless selected with the benchmark marker:
+
+    pytest -m benchmark tests/test_benchmarks.py
+
+Set MINIWORLD_BENCHMARK_HISTORY to the path of a file to append the
+results of each run to it as a JSON line, along with the current commit,
+so that timings can be tracked over time:
+
+    MINIWORLD_BENCHMARK_HISTORY=bench.jsonl pytest -m benchmark tests/test_benchmarks.py
+"""
+
+import json
+import os
+import subprocess
+import time
+
+import gymnasium as gym
+import numpy as np
+import pytest
+
+from miniworld.entity import Agent, Box
+from miniworld.math import Y_VEC, gen_rot_matrix, intersect_circle_segs
+from miniworld.miniworld import Room
+from miniworld.objmesh import ObjMesh
+from miniworld.opengl import Texture
+from miniworld.params import DEFAULT_PARAMS
+from miniworld.utils import get_file_path
+
+pytestmark = pytest.mark.benchmark
+
+# Time spent measuring each benchmark, in seconds
+DURATION = float(os.environ.get("MINIWORLD_BENCHMARK_DURATION", 0.05))
+
+# Median times of the benchmarks run, indexed by name
+RESULTS = {}
+
+
+def bench(name, fn, min_calls=3):
+    """
+    Measure the median time of a function call, in microseconds
+    """
+
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_calls or time.perf_counter() - start < DURATION:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+
+    RESULTS[name] = 1e6 * float(np.median(times))
+    return RESULTS[name]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def history():
+    yield
+
+    path = os.environ.get("MINIWORLD_BENCHMARK_HISTORY")
+    if not path or not RESULTS:
+        return
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(__file__),
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    record = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "results": RESULTS,
+    }
+    with open(path, "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture(scope="module")
+def world():
+    """
+    Environment providing an OpenGL context and a large room
+    """
+
+    env = gym.make("MiniWorld-OneRoom-v0", size=40)
+    env.reset(seed=0)
+    env.unwrapped._make_current()
+    yield env.unwrapped
+    env.close()
+
+
+@pytest.mark.parametrize("num_segs", [4, 64, 1024])
+def test_intersect_circle_segs(num_segs):
+    rng = np.random.default_rng(0)
+    segs = rng.uniform(-10, 10, size=(num_segs, 2, 3))
+    segs[:, :, 1] = 0
+
+    # A point away from all the segments, so they are all tested
+    point = np.array([20.0, 0, 20.0])
+    assert not intersect_circle_segs(point, 0.4, segs)
+
+    bench(
+        f"intersect_circle_segs[{num_segs}]",
+        lambda: intersect_circle_segs(point, 0.4, segs),
+    )
+
+
+@pytest.mark.parametrize("num_ents", [1, 16, 128])
+def test_intersect_entities(world, num_ents):
+    entities = list(world.entities)
+    for _ in range(num_ents):
+        world.place_entity(Box(color="red", size=0.5))
+
+    agent = world.agent
+    bench(
+        f"MiniWorldEnv.intersect[{num_ents}]",
+        lambda: world.intersect(agent, agent.pos, agent.radius),
+    )
+
+    world.entities = entities
+
+
+@pytest.mark.parametrize("num_portals", [0, 4, 16])
+def test_room_static_data(num_portals):
+    outline = np.array([[20, 20], [20, 0], [0, 0], [0, 20]], dtype=float)
+
+    def gen_static_data():
+        room = Room(outline)
+        for i in range(num_portals):
+            start = 1 + 4 * (i // 4)
+            room.add_portal(i % 4, start_pos=start, end_pos=start + 2)
+        room._gen_static_data(DEFAULT_PARAMS, None)
+
+    bench(f"Room._gen_static_data[{num_portals}]", gen_static_data)
+
+
+def largest_meshes(count=3):
+    meshes_dir = os.path.dirname(get_file_path("meshes", "ball", "obj"))
+    paths = [
+        os.path.join(meshes_dir, name)
+        for name in sorted(os.listdir(meshes_dir))
+        if name.endswith(".obj")
+    ]
+    return sorted(paths, key=os.path.getsize, reverse=True)[:count]
+
+
+@pytest.mark.parametrize("path", largest_meshes(), ids=os.path.basename)
+def test_objmesh_load(path):
+    # Meshes are created directly, bypassing the cache
+    name = os.path.basename(path)
+    bench(f"ObjMesh.__init__[{name}]", lambda: ObjMesh(path), min_calls=1)
+
+
+@pytest.mark.parametrize("tex_name", ["stripes_big", "concrete"])
+def test_texture_load(world, tex_name):
+    world._make_current()
+    path = Texture.get_paths(tex_name)[0]
+    textures = []
+    bench(
+        f"Texture.load[{tex_name}]",
+        lambda: textures.append(Texture.load(path)),
+        min_calls=1,
+    )
+
+    # Textures are deleted when collected, while the context is current
+    world._make_current()
+    textures.clear()
+
+
+def test_camera():
+    agent = Agent()
+    agent.randomize(DEFAULT_PARAMS, None)
+    agent.pos = np.array([1.0, 0, 2.0])
+    agent.dir = 0.3
+
+    bench("gen_rot_matrix", lambda: gen_rot_matrix(Y_VEC, 0.3))
+    bench("Agent.cam_pos", lambda: agent.cam_pos)
+    bench("Agent.cam_dir", lambda: agent.cam_dir)
+
+
+@pytest.mark.parametrize("width, height", [(80, 60), (640, 480)])
+def test_frame_buffer(world, width, height):
+    # Frame buffers of the env's resources are freed when it is closed
+    world._make_current()
+    frame_buffer = world.gl.frame_buffer(width, height, 8)
+    world.render_obs(frame_buffer)
+
+    out = np.zeros((height, width, 3), dtype=np.uint8)
+    bench(f"FrameBuffer.resolve[{width}x{height}]", lambda: frame_buffer.resolve(out))
+    bench(
+        f"FrameBuffer.get_depth_map[{width}x{height}]",
+        lambda: frame_buffer.get_depth_map(0.04, 100.0),
+    )
@@ -1,16 +1,39 @@
 import importlib
 import math
+import multiprocessing
 import pickle
+import subprocess
+import sys
 import warnings
 
 import gymnasium as gym
+import numpy as np
+import pyglet
 import pytest
+from gymnasium.envs.registration import EnvSpec
 from gymnasium.utils.env_checker import check_env, data_equivalence
+from gymnasium.vector.utils import create_shared_memory
 
 import miniworld
-from miniworld.entity import TextFrame
-from miniworld.miniworld import MiniWorldEnv
-from miniworld.wrappers import PyTorchObsWrapper
+from miniworld.assets import build_archive, get_archive
+from miniworld.cache import ObsCache
+from miniworld.entity import Box, TextFrame
+from miniworld.layouts import LayoutPool
+from miniworld.miniworld import GainSchedule, MiniWorldEnv
+from miniworld.objmesh import ObjMesh
+from miniworld.opengl import GLContext, Texture
+from miniworld.params import DEFAULT_PARAMS
+from miniworld.recording import EpisodeRecorder, EpisodeReplayer
+from miniworld.trajectories import TrajectoryReader, TrajectoryWrapper, TrajectoryWriter
+from miniworld.utils import get_file_path
+from miniworld.vector import MiniWorldEnvPool, _worker, make_vector_env
+from miniworld.wrappers import (
+    FrameStack,
+    GreyscaleWrapper,
+    ObservationPipeline,
+    PyTorchObsWrapper,
+    VectorFrameStack,
+)
 
 
 def test_miniworld():
@@ -153,3 +176,738 @@ def test_pickle_env(env_id):
 
     env.close()
     pickled_env.close()
+
+
+@pytest.mark.parametrize("env_id", ["MiniWorld-FourRooms-v0", "MiniWorld-MazeS3-v0"])
+def test_room_index(env_id):
+    # The point location index must agree with a brute-force search
+    env = gym.make(env_id).unwrapped
+    env.reset(seed=0)
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(
+        low=[env.min_x - 1, 0, env.min_z - 1],
+        high=[env.max_x + 1, 0, env.max_z + 1],
+        size=(500, 3),
+    )
+
+    idxs = env.room_index.room_indices(points)
+    for p, idx in zip(points, idxs):
+        expected = [r for r in env.rooms if r.point_inside(p)]
+        assert env.room_index.rooms_at(p) == expected
+        if len(expected) == 0:
+            assert idx == -1
+            assert env.room_at(p) is None
+        else:
+            assert env.rooms[idx] is expected[0]
+            assert env.room_at(p) is expected[0]
+
+    env.close()
+
+
+@pytest.mark.parametrize(
+    "env_id", ["MiniWorld-FourRooms-v0", "MiniWorld-MazeS3Fast-v0"]
+)
+def test_nav_grid(env_id):
+    # Following the navigation grid should lead the agent to the goal
+    env = gym.make(env_id).unwrapped
+
+    for seed in range(3):
+        env.reset(seed=seed)
+        dist = env.distance_to(env.box)
+        assert np.isfinite(dist)
+        assert dist >= np.linalg.norm(env.box.pos - env.agent.pos) - 0.5
+
+        reached = False
+        for _ in range(env.max_episode_steps):
+            env.step(env.best_action(env.box))
+            d = np.linalg.norm(env.box.pos - env.agent.pos)
+            if d < env.box.radius + env.agent.radius + 0.3:
+                reached = True
+                break
+        assert reached
+
+    env.close()
+
+
+def test_vector_env():
+    env = make_vector_env("MiniWorld-OneRoomS6Fast-v0", 3, max_episode_steps=3)
+    obs, _ = env.reset(seed=[0, 1, 2])
+
+    # Sub-environments render the same observations as standalone ones
+    single_env = gym.make("MiniWorld-OneRoomS6Fast-v0")
+    single_obs, _ = single_env.reset(seed=1)
+    assert obs.shape == (3,) + single_env.observation_space.shape
+    assert np.array_equal(obs[1], single_obs)
+    single_env.close()
+
+    # Finished episodes are automatically reset
+    finished = np.zeros(3, dtype=bool)
+    for _ in range(3):
+        obs, rewards, terminated, truncated, info = env.step([0, 0, 0])
+        assert obs.shape == env.observation_space.shape
+        assert rewards.shape == (3,)
+        done = terminated | truncated
+        if done.any():
+            assert np.array_equal(info["_final_observation"], done)
+        finished |= done
+    assert finished.all()
+
+    env.close()
+
+
+def test_vector_env_batched_moves():
+    env_id = "MiniWorld-PickupObjects-v0"
+    env = make_vector_env(env_id, 3)
+    env.reset(seed=[0, 1, 2])
+    single_envs = [gym.make(env_id) for _ in range(3)]
+    for seed, single_env in enumerate(single_envs):
+        single_env.reset(seed=seed)
+
+    # Moves are planned in a batch, without per-world collision tests
+    calls = []
+    for sub_env in env.envs:
+        world = sub_env.unwrapped
+        world.intersect = lambda *args, world=world: calls.append(args) or (
+            MiniWorldEnv.intersect(world, *args)
+        )
+
+    # Agents walk into walls and objects the same way as standalone ones
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        actions = rng.choice([0, 1, 2, 2, 2, 3], size=3)
+        env.step(actions)
+        for sub_env, single_env, action in zip(env.envs, single_envs, actions):
+            single_env.step(action)
+            agent = sub_env.unwrapped.agent
+            single_agent = single_env.unwrapped.agent
+            assert np.array_equal(agent.pos, single_agent.pos)
+            assert agent.dir == single_agent.dir
+    assert calls == []
+
+    for single_env in single_envs:
+        single_env.close()
+    env.close()
+
+
+def test_async_vector_env():
+    env = make_vector_env(
+        "MiniWorld-OneRoomS6Fast-v0", 2, asynchronous=True, max_episode_steps=3
+    )
+    obs, _ = env.reset(seed=[0, 1])
+
+    # Observations are rendered into shared memory by the workers
+    single_env = gym.make("MiniWorld-OneRoomS6Fast-v0")
+    single_obs, _ = single_env.reset(seed=1)
+    assert np.array_equal(obs[1], single_obs)
+    single_env.close()
+
+    finished = np.zeros(2, dtype=bool)
+    for _ in range(3):
+        obs, rewards, terminated, truncated, info = env.step([0, 0])
+        done = terminated | truncated
+        if done.any():
+            final_obs = info["final_observation"][done]
+            assert all(o.shape == single_obs.shape for o in final_obs)
+        finished |= done
+    assert finished.all()
+    assert env.get_attr("max_episode_steps") == (50, 50)
+
+    env.close()
+
+
+def test_worker_preload(monkeypatch):
+    # Start from empty caches, restored after the test
+    monkeypatch.setattr(Texture, "tex_cache", {})
+    monkeypatch.setattr(ObjMesh, "cache", {})
+
+    # Run a worker in this process, until the queued close command
+    env_id = "MiniWorld-Sidewalk-v0"
+    dummy_env = gym.make(env_id)
+    space = dummy_env.observation_space
+    dummy_env.close()
+    shm = create_shared_memory(space, n=1)
+    final_shm = create_shared_memory(space, n=1)
+    parent_pipe, child_pipe = multiprocessing.Pipe()
+    unused_pipe, _ = multiprocessing.Pipe()
+    parent_pipe.send(("close", None))
+    _worker(0, env_id, {}, 1, child_pipe, unused_pipe, shm, final_shm)
+    assert parent_pipe.recv() == (None, True)
+
+    # Every version of the textures and the meshes were loaded at startup
+    tex_names = set(tex.name for tex in Texture.tex_cache.values())
+    assert "asphalt" in tex_names
+    for tex_name in tex_names:
+        for path in Texture.get_paths(tex_name):
+            assert Texture.tex_cache[path].tex is not None
+    assert len(ObjMesh.cache) > 0
+    assert all(mesh.vlists is not None for mesh in ObjMesh.cache.values())
+
+
+def test_env_pool():
+    env = MiniWorldEnvPool("MiniWorld-OneRoomS6Fast-v0", 3, batch_size=2)
+    env.async_reset(seed=0)
+
+    for _ in range(6):
+        obs, rewards, terminated, truncated, info = env.recv()
+        env_ids = info["env_id"]
+        assert obs.shape == (2,) + env.single_observation_space.shape
+        assert len(set(env_ids)) == 2
+        env.send([0, 0], env_ids)
+
+    # Wait for all the environments before querying them
+    _, _, _, _, info = env.recv(batch_size=3)
+    assert sorted(info["env_id"]) == [0, 1, 2]
+    assert env.get_attr("max_episode_steps") == (50, 50, 50)
+    env.close()
+
+
+def test_state_obs():
+    env = gym.make("MiniWorld-PickupObjects-v0", obs_mode="state")
+    obs, _ = env.reset(seed=0)
+    assert env.observation_space.contains(obs)
+
+    # No OpenGL context is created for state observations
+    assert env.unwrapped.gl is None
+
+    world = env.unwrapped
+    assert np.allclose(obs[:2], world.agent.pos[[0, 2]])
+    num_ents = min(len(world.entities) - 1, world.max_state_entities)
+    assert obs[12 : 12 + 3 * num_ents : 3].all()
+
+    obs, _, _, _, _ = env.step(world.actions.move_forward)
+    assert np.allclose(obs[4:6], world.agent_vel[[0, 2]])
+    assert env.observation_space.contains(obs)
+
+    env.close()
+
+
+@pytest.mark.parametrize(
+    "env_id", ["MiniWorld-PickupObjects-v0", "MiniWorld-MazeS3-v0"]
+)
+def test_keep_same_env(env_id):
+    env = gym.make(env_id)
+    env.reset(seed=0)
+    world = env.unwrapped
+    rooms = world.rooms
+    wall_segs = world.wall_segs
+    static_list = world.static_list
+    agent_pos = world.agent.pos.copy()
+
+    # The layout is reused, with the agent and dynamic entities placed again
+    obs, _ = env.reset(options={"keep_same_env": True})
+    assert world.rooms is rooms
+    assert world.wall_segs is wall_segs
+    assert world.static_list == static_list
+    assert not np.array_equal(world.agent.pos, agent_pos)
+    assert world.agent in world.entities
+    assert obs.shape == env.observation_space.shape
+
+    # Options without the key do a full reset
+    env.reset(options={})
+    assert world.rooms is not rooms
+
+    env.close()
+
+
+class BoxListEnv(MiniWorldEnv):
+    """
+    Room whose boxes are kept in a list created in __init__
+    """
+
+    layout_attrs = ["boxes"]
+
+    def __init__(self, **kwargs):
+        self.boxes = []
+        super().__init__(max_episode_steps=50, **kwargs)
+
+    def _gen_world(self):
+        self.add_rect_room(min_x=0, max_x=6, min_z=0, max_z=6)
+        self.boxes.clear()
+        for _ in range(2):
+            self.boxes.append(self.place_entity(Box(color="red")))
+        self.place_agent()
+
+
+def test_layout_pool():
+    pool = LayoutPool("MiniWorld-MazeS3-v0", size=2, seed=0)
+    env = gym.make("MiniWorld-MazeS3-v0")
+    world = env.unwrapped
+    world.layout_pool = pool
+
+    for _ in range(3):
+        obs, _ = env.reset()
+        assert obs.shape == env.observation_space.shape
+
+        # Attributes set by _gen_world refer to the instantiated entities
+        assert world.box in world.entities
+        assert world.agent in world.entities
+        assert not world.intersect(world.agent, world.agent.pos, world.agent.radius)
+        assert len(world.wall_segs) > 0
+
+    pool.close()
+    env.close()
+
+    # Lists created in __init__ and filled by _gen_world are restored
+    # from the pool once declared in layout_attrs
+    spec = EnvSpec("MiniWorld-BoxList-v0", entry_point=BoxListEnv)
+    pool = LayoutPool(spec, size=2, seed=0)
+    env = gym.make(spec)
+    world = env.unwrapped
+    world.layout_pool = pool
+
+    for _ in range(3):
+        env.reset()
+        assert len(world.boxes) == 2
+        assert all(box in world.entities for box in world.boxes)
+
+    pool.close()
+    env.close()
+
+
+def test_get_set_state():
+    env = gym.make("MiniWorld-PickupObjects-v0", domain_rand=True)
+    env.reset(seed=0)
+    world = env.unwrapped
+    for _ in range(5):
+        world.step(world.actions.move_forward)
+    state = world.get_state()
+    static_list = world.static_list
+    static_version = world.static_version
+
+    # Branches from the same state are identical
+    actions = [0, 2, 2, 1, 2, 4, 2, 3]
+    branches = []
+    for _ in range(2):
+        obs = world.set_state(state)
+
+        # The static geometry of the same layout is not compiled again
+        assert world.static_list is static_list
+        assert world.static_version == static_version
+
+        rewards = []
+        for action in actions:
+            obs, reward, _, _, _ = world.step(action)
+            rewards.append(reward)
+        branches.append((obs, rewards, world.agent.pos.copy(), world.step_count))
+
+    (obs0, rewards0, pos0, count0), (obs1, rewards1, pos1, count1) = branches
+    assert np.array_equal(obs0, obs1)
+    assert rewards0 == rewards1
+    assert np.array_equal(pos0, pos1)
+    assert count0 == count1 == 5 + len(actions)
+
+    env.close()
+
+
+@pytest.mark.parametrize(
+    "env_id", ["MiniWorld-TaskHallwaySimple-v0", "MiniWorld-TaskHallway-v0"]
+)
+def test_episode_replay(tmp_path, env_id):
+    path = tmp_path / "episodes.bin"
+    env = EpisodeRecorder(gym.make(env_id), path)
+    env.action_space.seed(0)
+
+    # The second episode continues the random stream of the first one
+    recorded = []
+    for seed in [0, None]:
+        obs, _ = env.reset(seed=seed)
+        episode = [obs]
+        for step in range(10):
+            if step == 4:
+                env.unwrapped.change_gain(random=True)
+            obs, _, _, _, _ = env.step(env.action_space.sample())
+            episode.append(obs)
+        recorded.append(episode)
+    env.close()
+
+    replayer = EpisodeReplayer(path)
+    assert len(replayer) == 2
+    assert replayer.num_steps(1) == 10
+    for index, episode in enumerate(recorded):
+        frames = replayer.replay(index, frames=[0, 5, 10])
+        for frame, step in zip(frames, [0, 5, 10]):
+            assert np.array_equal(frame, episode[step])
+
+    # Frames can be rendered at another resolution
+    (frame,) = replayer.replay(1, frames=[3], width=160, height=120)
+    assert frame.shape == (120, 160, 3)
+    replayer.close()
+
+
+def test_trajectory_writer(tmp_path):
+    writer = TrajectoryWriter(tmp_path, chunk_size=16)
+    env = TrajectoryWrapper(gym.make("MiniWorld-OneRoom-v0"), writer, depth=True)
+
+    # Episodes span several chunks
+    observations = []
+    for seed in range(2):
+        obs, _ = env.reset(seed=seed)
+        observations.append(obs)
+        for _ in range(20):
+            obs, _, _, _, _ = env.step(env.action_space.sample())
+            observations.append(obs)
+    env.close()
+
+    reader = TrajectoryReader(tmp_path)
+    assert len(reader) == 42
+    assert reader.episodes == [0, 21]
+    assert np.array_equal(reader.get("obs", 0, 42), np.stack(observations))
+    assert reader.episode(1, "pos").shape == (21, 3)
+    assert reader.episode(1, "depth").shape == (21, 60, 80, 1)
+    assert reader.episode(0, "action")[0] == 0
+
+    # Depth maps are rendered for state observations
+    writer = TrajectoryWriter(tmp_path / "state", chunk_size=16)
+    env = TrajectoryWrapper(
+        gym.make("MiniWorld-OneRoom-v0", obs_mode="state"), writer, depth=True
+    )
+    env.reset(seed=0)
+    for _ in range(3):
+        env.step(env.unwrapped.actions.turn_left)
+    depth = env.unwrapped.render_depth()
+    env.close()
+
+    reader = TrajectoryReader(tmp_path / "state")
+    assert np.array_equal(reader.get("depth", 3, 4)[0], depth)
+
+
+def test_sample_table():
+    rng = np.random.default_rng(0)
+    values = DEFAULT_PARAMS.sample_table(rng, 100, ["sky_color", "turn_step"])
+    assert values["sky_color"].shape == (100, 3)
+    assert np.all(values["turn_step"] >= 10) and np.all(values["turn_step"] <= 20)
+    assert np.unique(values["turn_step"]).size == 100
+
+    # Without a random number generator, the defaults are used
+    values = DEFAULT_PARAMS.sample_table(None, 4)
+    assert np.all(values["turn_step"] == 15)
+
+    # Copies can be modified without affecting the original
+    params = DEFAULT_PARAMS.no_random()
+    params.set("turn_step", 5)
+    assert params.sample_table(rng, 1)["turn_step"][0] == 5
+    assert DEFAULT_PARAMS.get_max("turn_step") == 20
+
+    # The motion parameters are drawn on reset from the seeded generator
+    positions = []
+    for _ in range(2):
+        env = gym.make("MiniWorld-Hallway-v0", domain_rand=True, obs_mode="state")
+        env.reset(seed=3)
+        for _ in range(5):
+            env.step(env.unwrapped.actions.move_forward)
+        positions.append(env.unwrapped.agent.pos.copy())
+        env.close()
+    assert np.array_equal(positions[0], positions[1])
+
+
+def test_gain_schedule():
+    schedule = GainSchedule([-1, 4, 9, 19], [1, 0.5, 2])
+    xs = np.array([-2, -1, 3.9, 4, 8, 9, 18, 25])
+    sections = [schedule.section(x) for x in xs]
+    assert sections == [0, 0, 0, 1, 1, 2, 2, 2]
+    assert np.array_equal(schedule.sections(xs), sections)
+
+    env = gym.make(
+        "MiniWorld-TaskHallwayControl-v0",
+        sections_glitch=[0, 0, 1],
+        params=DEFAULT_PARAMS.no_random(),
+        obs_mode="state",
+        max_episode_steps=1000,
+    )
+    env.reset(seed=0)
+    world = env.unwrapped
+    forward_step = world.params.sample(None, "forward_step")
+    prev_section = 0
+    glitched = False
+    for _ in range(500):
+        x = world.agent.pos[0]
+        _, _, termination, _, info = env.step(world.actions.move_forward)
+        assert info["gain"] == schedule.gains[schedule.section(x)]
+        dx = world.agent.pos[0] - x
+        if info["section"] == 2 and prev_section == 1:
+            # Entering the last section skips ahead
+            assert np.isclose(dx, forward_step * info["gain"] + 1)
+            glitched = True
+        else:
+            assert np.isclose(dx, forward_step * info["gain"])
+        prev_section = info["section"]
+        if termination:
+            break
+    assert termination and glitched
+
+    # Changing the gain replaces that of the current section, in a copy
+    # of the schedule which saved states don't share
+    env.reset(seed=0)
+    schedule = world.gain_schedule
+    state = world.get_state()
+    world.change_gain(random=False, gain=3)
+    x = world.agent.pos[0]
+    _, _, _, _, info = env.step(world.actions.move_forward)
+    assert info["gain"] == 3
+    assert np.isclose(world.agent.pos[0] - x, forward_step * 3)
+    assert schedule.gains[0] == 1
+    world.set_state(state)
+    assert world.gain_schedule is schedule
+    env.close()
+
+    # Extra gains are ignored, missing ones are reported
+    env = gym.make("MiniWorld-TaskHallwayControl-v0", nb_sections=2)
+    env.reset(seed=0)
+    assert len(env.unwrapped.gain_schedule) == 2
+    env.close()
+    with pytest.raises(ValueError):
+        gym.make("MiniWorld-TaskHallwayControl-v0", nb_sections=4)
+
+
+def test_obs_cache():
+    env = gym.make("MiniWorld-TaskHallwaySimple-v0", reset_keep_same_length=True)
+    world = env.unwrapped
+
+    # The first reset generates the hallway, which the next episodes keep
+    env.reset(seed=0)
+    world.obs_cache = ObsCache()
+
+    # Episodes starting from the same pose observe the same poses again
+    for _ in range(2):
+        env.reset(seed=0)
+        for action in [0, 2, 2, 1, 2]:
+            obs, _, _, _, _ = env.step(action)
+            assert np.array_equal(obs, world.render_obs())
+    assert world.obs_cache.hits == 6
+    assert world.obs_cache.misses == 6
+
+    # The least recently used observations are evicted
+    world.obs_cache = ObsCache(max_bytes=3 * obs.nbytes)
+    for _ in range(5):
+        env.step(world.actions.turn_left)
+    assert len(world.obs_cache) == 3
+    assert world.obs_cache.nbytes == 3 * obs.nbytes
+    env.close()
+
+
+def test_skip_unchanged_render():
+    env = gym.make("MiniWorld-OneRoom-v0")
+    env.reset(seed=0)
+    world = env.unwrapped
+
+    # Walk into a wall, after which moving forward is blocked
+    for _ in range(100):
+        obs, _, _, _, _ = env.step(world.actions.move_forward)
+    version = world.world_version
+    blocked_obs, _, _, _, _ = env.step(world.actions.move_forward)
+    assert world.world_version == version
+    assert np.array_equal(blocked_obs, obs)
+
+    # Turning changes the view
+    turned_obs, _, _, _, _ = env.step(world.actions.turn_left)
+    assert world.world_version > version
+    assert not np.array_equal(turned_obs, obs)
+
+    # Entities removed by env code are noticed as well
+    dx, _, dz = world.box.pos - world.agent.pos
+    world.agent.dir = math.atan2(-dz, dx)
+    obs = world.render_obs()
+    world.entities.remove(world.box)
+    removed_obs = world.render_obs()
+    assert not np.array_equal(removed_obs, obs)
+
+    # Rendering again after an invalidation gives the same frame
+    world.invalidate_obs()
+    assert np.array_equal(removed_obs, world.render_obs())
+    env.close()
+
+
+def test_memory_report():
+    env = gym.make("MiniWorld-OneRoom-v0")
+    env.reset(seed=0)
+    env.step(0)
+    report = env.unwrapped.memory_report()
+
+    assert report["shared"]["frame_buffers"]["gl_bytes"] > 0
+    assert report["env"]["static_geometry"]["host_bytes"] > 0
+    assert report["shared"]["textures"]["count"] > 0
+    assert report["env_total"]["host_bytes"] == sum(
+        usage["host_bytes"] for usage in report["env"].values()
+    )
+    assert report["process_rss"] > 0
+    env.close()
+
+
+def test_lazy_import():
+    # A bare import registers the environments without importing them
+    code = (
+        "import sys, miniworld, gymnasium as gym;"
+        "assert 'MiniWorld-Hallway-v0' in gym.envs.registry;"
+        "assert 'pyglet' not in sys.modules;"
+        "assert 'miniworld.envs.hallway' not in sys.modules;"
+        "assert 'miniworld.miniworld' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+    assert miniworld.envs.Hallway.__module__ == "miniworld.envs.hallway"
+    assert miniworld.envs.MiniWorldEnv is MiniWorldEnv
+
+
+def test_lazy_construction():
+    env = gym.make("MiniWorld-Hallway-v0")
+    world = env.unwrapped
+
+    # Neither the OpenGL context nor the world exist before the first reset
+    assert world.gl is None
+    assert "agent" not in vars(world)
+
+    obs, _ = env.reset(seed=0)
+    assert world.gl is not None
+    assert obs.shape == env.observation_space.shape
+    env.close()
+
+
+def test_shared_context():
+    env1 = gym.make("MiniWorld-OneRoom-v0")
+    env2 = gym.make("MiniWorld-Hallway-v0")
+    obs1, _ = env1.reset(seed=0)
+    env2.reset(seed=0)
+    world1, world2 = env1.unwrapped, env2.unwrapped
+
+    # Both envs render through the same context and frame buffers,
+    # with their own display lists
+    assert world1.gl.context is world2.gl.context
+    assert world1.obs_fb is world2.obs_fb
+    assert world1.static_list != world2.static_list
+
+    # The frame buffer was used by the other env since
+    assert np.array_equal(world1.render_obs(), obs1)
+
+    # Envs release the context when closed, and the last one destroys it
+    context = world1.gl.context
+    ref_count = context.ref_count
+    env2.close()
+    assert context.ref_count == ref_count - 1
+    world1.invalidate_obs()
+    assert np.array_equal(world1.render_obs(), obs1)
+    env1.close()
+    assert context.ref_count == ref_count - 2
+    if context.ref_count == 0:
+        assert context.frame_buffers == {}
+        assert GLContext.current is None
+
+
+def test_asset_archive(tmp_path, monkeypatch):
+    tex_path = Texture.get_paths("cardboard")[0]
+    mesh_path = get_file_path("meshes", "barrel", "obj")
+    archive_path = str(tmp_path / "assets.pack")
+    build_archive(archive_path, textures=[tex_path], meshes=[mesh_path])
+
+    monkeypatch.setenv("MINIWORLD_ASSET_ARCHIVE", archive_path)
+    get_archive.cache_clear()
+    try:
+        # Textures and meshes are read from the archive without decoding
+        tex = Texture(tex_path, "cardboard")
+        assert tex.img is None
+        decoded = Texture(Texture.get_paths("cardboard")[1], "cardboard")
+        assert decoded.img is not None
+
+        img = pyglet.image.load(tex_path)
+        pixels = img.get_image_data().get_data("RGBA", img.width * 4)
+        assert tex.pixels.tobytes() == pixels
+
+        mesh = ObjMesh(mesh_path)
+        parsed = ObjMesh(mesh_path, use_archive=False)
+        assert np.array_equal(mesh.max_coords, parsed.max_coords)
+        for chunk, parsed_chunk in zip(mesh.chunk_data, parsed.chunk_data):
+            for array, parsed_array in zip(chunk[:4], parsed_chunk[:4]):
+                assert np.array_equal(array, parsed_array)
+            assert chunk[4] == parsed_chunk[4]
+    finally:
+        get_archive.cache_clear()
+
+
+def test_observation_pipeline():
+    env = gym.make("MiniWorld-OneRoom-v0")
+    pipeline = ObservationPipeline(
+        env,
+        size=(30, 40),
+        greyscale=True,
+        layout="chw",
+        dtype=np.float32,
+        scale=1 / 255,
+        num_stack=3,
+    )
+    assert pipeline.observation_space.shape == (3, 30, 40)
+
+    obs, _ = pipeline.reset(seed=0)
+    assert pipeline.observation_space.contains(obs)
+    assert np.array_equal(obs[0], obs[2])
+
+    # Compare with the same preprocessing done step by step
+    raw, _, _, _, _ = env.step(env.unwrapped.actions.turn_left)
+    pipeline.observation(raw)
+    new_obs = pipeline.observation(raw)
+    resized = raw[1::2, 1::2].astype(np.float32)
+    grey = resized @ np.array([0.30, 0.59, 0.11], dtype=np.float32)
+    assert np.allclose(new_obs[2], grey / 255)
+    assert np.array_equal(new_obs[1], new_obs[2])
+    assert np.array_equal(new_obs[0], obs[2])
+
+    # Without any preprocessing, observations are left as they are
+    pipeline = ObservationPipeline(env, num_stack=2)
+    assert pipeline.observation_space.shape == (60, 80, 6)
+    obs = pipeline.observation(raw)
+    assert np.array_equal(obs[:, :, 3:], raw)
+    env.close()
+
+
+def test_frame_stack():
+    env = gym.make("MiniWorld-OneRoom-v0")
+    stacked = FrameStack(env, 3)
+    assert stacked.observation_space.shape == (3, 60, 80, 3)
+
+    obs, _ = stacked.reset(seed=0)
+    assert stacked.observation_space.contains(obs)
+    first = obs[2].copy()
+    assert all(np.array_equal(frame, first) for frame in obs)
+
+    # Observations are rendered straight into the ring buffer
+    assert env.unwrapped.obs_buffer is None
+    history = [first, first, first]
+    for _ in range(5):
+        obs, _, _, _, _ = stacked.step(env.unwrapped.actions.turn_left)
+        history.append(env.unwrapped.render_obs())
+        assert np.shares_memory(obs, stacked.ring.frames)
+        assert np.array_equal(stacked.stack(), np.stack(history[-3:]))
+    assert len(stacked.frames()) == 3
+    assert np.array_equal(stacked.frames()[0], history[-3])
+
+    # Observations transformed by other wrappers are copied instead
+    for wrapper in [PyTorchObsWrapper, GreyscaleWrapper]:
+        wrapped = wrapper(env)
+        stacked = FrameStack(wrapped, 2)
+        assert not stacked.direct
+        obs, _ = stacked.reset(seed=0)
+        assert obs.shape == (2,) + wrapped.observation_space.shape
+        obs, _, _, _, _ = stacked.step(env.unwrapped.actions.turn_left)
+        expected = wrapped.observation(env.unwrapped.render_obs())
+        assert np.array_equal(obs[1], expected.astype(obs.dtype))
+    env.close()
+
+    # Batched stacking, with the stack of each env filled on reset
+    vec_env = VectorFrameStack(
+        make_vector_env(
+            "MiniWorld-OneRoom-v0",
+            2,
+            max_episode_steps=2,
+            params=DEFAULT_PARAMS.no_random(),
+        ),
+        2,
+    )
+    assert vec_env.observation_space.shape == (2, 2, 60, 80, 3)
+    obs, _ = vec_env.reset(seed=0)
+    assert np.array_equal(obs[:, 0], obs[:, 1])
+    first = obs[:, 1].copy()
+    obs, _, _, truncations, _ = vec_env.step(np.array([1, 1]))
+    assert np.array_equal(obs[:, 0], first)
+    obs, _, _, truncations, _ = vec_env.step(np.array([1, 1]))
+    assert truncations.all()
+    assert np.array_equal(obs[:, 0], obs[:, 1])
+    vec_env.close()